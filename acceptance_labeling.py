@@ -1,10 +1,169 @@
 import argparse
+import collections
+import functools
 import json
 import os
 import re
 import logging
+import multiprocessing
 import sys
 import progressbar
+from json_stream import iter_venue_years, dump_venue_years, dumps_submission
+
+
+# Declarative rules of the labeling. Texts are compared in lower case, a rule matches if it contains the words.
+# Some venues use simple comments for the decision. We ignore them because the invitation is not
+# exclusively used for the decision so the false classification risk is too high.
+RULES = {
+    # the submission itself was withdrawn (invitation of the submission)
+    "withdrawn_invitation": ("withdraw",),
+    # venues in 2013 and 2014 often have the decision in the content of the submission
+    "content_decision_key": "decision",
+    # only found in ICLR 2020 as far as we are aware (invitation of a note)
+    "desk_reject_invitation": ("desk_reject",),
+    # a decision note ends the search for a decision
+    "decision_invitation": ("decision", "acceptance"),
+    # naming varies for the field. Both decision and acceptance decision exist (part of the content key)
+    "decision_key": "decision",
+    # verdicts of a decision, the first rule whose words are all in the decision decides
+    "decision_verdicts": ((("reject", "accept"), "unknown"),
+                          (("reject",), "rejected"),
+                          (("accept",), "accepted")),
+    # We consider a submission accepted if it is not rejected. This is due to some venues only writing
+    # for what a submission is accepted (poster, talk, workshop) without writing the word 'accept'.
+    # 'Reject' is found in all rejected submission decisions (as far as we are aware).
+    "content_decision_default": "accepted",
+    "note_decision_default": "accepted",
+    # meta reviews do not stop the search unlike a decision note in case both are used for some reason.
+    # Currently, only ICLR 2019 and an ICAPS 2019 workshop uses meta reviews as far as we know.
+    "meta_review_invitation": ("meta",),
+    "meta_review_key": "recommendation",
+    "meta_review_verdicts": ((("reject",), "rejected"),
+                             (("accept",), "accepted")),
+    "meta_review_default": "unknown",
+}
+
+# Rules which differ for a venue year: (venue, year) -> changed entries of RULES
+VENUE_RULES = {
+    # decisions in the content of ICLR 2014 without accept or reject are not accepted
+    ("ICLR.cc", 2014): {"content_decision_default": "unknown"},
+}
+
+# maximal number of memoized invitations per compiled rule table
+MEMO_SIZE = 1 << 16
+
+
+@functools.lru_cache(maxsize=None)
+def compile_rules(venue, year):
+    """
+    Compile the rules of a venue year with its overrides into a function which decides the tag of one submission.
+    The rules are evaluated in one pass over the submission and its notes, each invitation is lower cased once.
+    :return: function(submission, log) -> tag or None if no rule decides
+    """
+    rules = dict(RULES, **VENUE_RULES.get((venue, year), {}))
+    withdrawn_invitation = rules["withdrawn_invitation"]
+    content_decision_key = rules["content_decision_key"]
+    desk_reject_invitation = rules["desk_reject_invitation"]
+    decision_invitation = rules["decision_invitation"]
+    decision_key = rules["decision_key"]
+    decision_verdicts = rules["decision_verdicts"]
+    content_decision_default = rules["content_decision_default"]
+    note_decision_default = rules["note_decision_default"]
+    meta_review_invitation = rules["meta_review_invitation"]
+    meta_review_key = rules["meta_review_key"]
+    meta_review_verdicts = rules["meta_review_verdicts"]
+    meta_review_default = rules["meta_review_default"]
+
+    def verdict(decision, verdicts, default, submission, log):
+        text = decision.lower()
+        for words, tag in verdicts:
+            for word in words:
+                if word not in text:
+                    break
+            else:
+                return tag
+        log.debug("Forum %s. Tagged as %s because no verdict matches. Decision: %s",
+                  submission["forum"], default, decision)
+        return default
+
+    # Invitations are shared by many notes (e.g. all reviews of a paper), so each distinct invitation is
+    # lower cased and classified once: invitation -> (desk reject, decision note, meta review)
+    note_kinds = {}
+    withdrawn_submissions = {}
+
+    def classify(invitation):
+        text = invitation.lower()
+        kind = (__contains_any(text, desk_reject_invitation), __contains_any(text, decision_invitation),
+                __contains_any(text, meta_review_invitation))
+        if len(note_kinds) >= MEMO_SIZE:
+            note_kinds.clear()
+        note_kinds[invitation] = kind
+        return kind
+
+    def decide(submission, log):
+        withdrawn = withdrawn_submissions.get(submission["invitation"])
+        if withdrawn is None:
+            withdrawn = __contains_any(submission["invitation"].lower(), withdrawn_invitation)
+            if len(withdrawn_submissions) >= MEMO_SIZE:
+                withdrawn_submissions.clear()
+            withdrawn_submissions[submission["invitation"]] = withdrawn
+        if withdrawn:
+            return "withdrawn"
+        content = submission["content"]
+        if content_decision_key in content:
+            log.debug("%s has decision in content", submission["forum"])
+            return verdict(content[content_decision_key], decision_verdicts, content_decision_default, submission, log)
+        tag = None
+        for note in submission["notes"]:
+            desk_reject, decision_note, meta_review = note_kinds.get(note["invitation"]) or classify(note["invitation"])
+            if desk_reject:
+                log.debug("%s was desk rejected", submission["forum"])
+                tag = "rejected"
+            if decision_note:
+                # a decision note ends the search
+                log.debug("%s has decision note", submission["forum"])
+                for key, value in note["content"].items():
+                    if decision_key in key.lower():
+                        tag = verdict(value, decision_verdicts, note_decision_default, submission, log)
+                break
+            elif meta_review:
+                log.debug("%s has meta review note", submission["forum"])
+                try:
+                    recommendation = note["content"][meta_review_key]
+                except KeyError:
+                    log.debug("Forum %s. Unexpected format of a meta review note.", submission["forum"])
+                    tag = "unknown"
+                    continue
+                tag = verdict(recommendation, meta_review_verdicts, meta_review_default, submission, log)
+        return tag
+
+    return decide
+
+
+def __contains_any(text, words):
+    for word in words:
+        if word in text:
+            return True
+    return False
+
+
+def label_submission(submission, venue, year, log):
+    """
+    Tag one submission for acceptance/rejection/withdrawal/unknown.
+    A tag which can not be decided keeps an existing tag of the submission or becomes unknown.
+    :param submission: submission with its notes, acceptance_tag is set in place
+    :param venue: venue of the submission, e.g. ICLR.cc
+    :param year: year of the submission
+    :param log: logger
+    :return: the tag
+    """
+    tag = compile_rules(venue, year)(submission, log)
+    if tag is not None:
+        submission["acceptance_tag"] = tag
+    elif "acceptance_tag" not in submission:
+        log.debug("Forum %s. No decision could be found.", submission["forum"])
+        submission["acceptance_tag"] = "unknown"
+    return submission["acceptance_tag"]
 
 
 def labeling(data_dict,log):
@@ -16,86 +175,99 @@ def labeling(data_dict,log):
     for venue_year in data_dict:
         log.info("Tagging {} {}".format(venue_year["venue"], venue_year["year"]))
         for submission in progressbar.progressbar(venue_year["submissions"]):
-            # First check if submission was withdrawn
-            if "withdraw" in submission["invitation"].lower():
-                submission["acceptance_tag"] = "withdrawn"
-            else:
-                # Venues in 2013 and 2014 often have the decision in the content of the submission
-                if "decision" in submission["content"]:
-                    log.debug("{} has decision in content".format(submission["forum"]))
-                    if "reject" in submission["content"]["decision"].lower() and "accept" in submission["content"]["decision"].lower():
-                        log.debug(
-                            "Forum {}. Tagged as unknown because decision is unclear. Decision: {}".format(
-                                submission["forum"], submission["content"]["decision"]))
-                        submission["acceptance_tag"] = "unknown"
-                    elif "reject" in submission["content"]["decision"].lower():
-                        submission["acceptance_tag"] = "rejected"
-                    elif "accept" in submission["content"]["decision"].lower():
-                        submission["acceptance_tag"] = "accepted"
-                    else:
-                        # exclude ICLR 2014 from this choice
-                        if not (venue_year["venue"] == "ICLR.cc" and venue_year["year"] == 2014):
-                            log.debug(
-                                "Forum {}. Tagged as accepted because not rejected. This might be wrong. Decision: {}".format(
-                                    submission["forum"], submission["content"]["decision"]))
-                            submission["acceptance_tag"] = "accepted"
-                        else:
-                            submission["acceptance_tag"] = "unknown"
-                else:
-                    for note in submission["notes"]:
-                        # Only found in ICLR 2020 as far as we are aware
-                        if "desk_reject" in note["invitation"].lower():
-                            log.debug("{} was desk rejected".format(submission["forum"]))
-                            submission["acceptance_tag"] = "rejected"
-
-                        # Found a decicion note
-                        if "decision" in note["invitation"].lower() or "acceptance" in note["invitation"].lower():
-                            log.debug("{} has decision note".format(submission["forum"]))
-                            # We consider a submission accepted if it is not rejected. This is due to some venues only writing
-                            # for what a submission is accepted (poster, talk, workshop) without writing the word 'accept'.
-                            # 'Reject' is found in all rejected submission decisions (as far as we are aware).
-                            for key in note["content"]:
-                                # Naming varies for the fild. Both decision and acceptance decision exist.
-                                if "decision" in key.lower():
-                                    if "reject" in note["content"][key].lower() and "accept" in note["content"][key].lower():
-                                        log.debug(
-                                            "Forum {}. Tagged as unknown because decision is unclear. Decision: {}".format(
-                                                submission["forum"], note["content"][key]))
-                                        submission["acceptance_tag"] = "unknown"
-                                    elif "reject" in note["content"][key].lower():
-                                        submission["acceptance_tag"] = "rejected"
-                                    elif "accept" in note["content"][key].lower():
-                                        submission["acceptance_tag"] = "accepted"
-                                    else:
-                                        log.debug(
-                                            "Forum {}. Tagged as accepted because not rejected. This might be wrong. Decision: {}".format(
-                                                submission["forum"], note["content"][key]))
-                                        submission["acceptance_tag"] = "accepted"
-                            break
-                        # Found a meta review
-                        # This will not stop the loop unlike a decision note in case both are used for some reason
-                        # Currently, only ICLR 2019 and an ICAPS 2019 workshop uses meta reviews as far as we know.
-                        elif "meta" in note["invitation"].lower():
-                            log.debug("{} has meta review note".format(submission["forum"]))
-                            try:
-                                if "reject" in note["content"]["recommendation"].lower():
-                                    submission["acceptance_tag"] = "rejected"
-                                elif "accept" in note["content"]["recommendation"].lower():
-                                    submission["acceptance_tag"] = "accepted"
-                                else:
-                                    submission["acceptance_tag"] = "unknown"
-                                    log.debug("Forum {}. Meta review without decision".format(submission["forum"]))
-                            except KeyError:
-                                submission["acceptance_tag"] = "unknown"
-                                log.debug("Forum {}. Unexpected format of a meta review note.".format(submission["forum"]))
-                # Some venues use simple comments for the decision. We ignore them because the invitation is not
-                # exclusively used for the decision so the false classification risk is too high.
-                if not "acceptance_tag" in submission:
-                    log.debug("Forum {}. No decision could be found.".format(submission["forum"]))
-                    submission["acceptance_tag"] = "unknown"
+            label_submission(submission, venue_year["venue"], venue_year["year"], log)
     return data_dict
 
 
+def parallel_labeling(venue_years, log, processes=None, chunk_size=64, indent=3):
+    """
+    Tag a stream of venue years in a pool of worker processes.
+    The submissions are sent to the workers as JSON text in chunks, which are parsed, tagged and serialized there
+    (this is where the time goes, the tagging itself is cheap). The chunks are streamed back in the order of the
+    input, so the output is deterministic. Only a few chunks per worker are in flight, memory stays bounded.
+    :param venue_years: iterable of (venue_year, submissions as JSON text), e.g. json_stream.iter_venue_years(f, raw=True)
+    :param log: logger
+    :param processes: number of worker processes, default is the number of CPUs. With 1, no pool is started
+    :param chunk_size: number of submissions per task
+    :param indent: indent of the serialized submissions
+    :return: generator of (venue_year, tagged submissions serialized with json_stream.dumps_submission)
+    """
+    processes = processes or os.cpu_count() or 1
+    pool = multiprocessing.Pool(processes, __init_worker, (log.getEffectiveLevel(),)) if processes > 1 else None
+    tasks = __chunk_tasks(venue_years, chunk_size, indent)
+    # venue years (dicts) and the results of their chunks in input order
+    pending = collections.deque()
+    in_flight = 0
+
+    def fill():
+        nonlocal in_flight
+        while in_flight < 4 * processes:
+            task = next(tasks, None)
+            if task is None:
+                return
+            if isinstance(task, dict):
+                pending.append(task)
+            else:
+                pending.append(pool.apply_async(__label_chunk, task) if pool else __label_chunk(*task))
+                in_flight += 1
+
+    def submissions():
+        nonlocal in_flight
+        while True:
+            fill()
+            if not pending or isinstance(pending[0], dict):
+                return
+            result = pending.popleft()
+            in_flight -= 1
+            for text in (result.get() if pool else result):
+                yield text
+
+    try:
+        fill()
+        while pending:
+            venue_year = pending.popleft()
+            log.info("Tagging {} {}".format(venue_year["venue"], venue_year["year"]))
+            tagged = submissions()
+            yield venue_year, tagged
+            for _ in tagged:
+                pass
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def __chunk_tasks(venue_years, chunk_size, indent):
+    # a venue year is followed by the tasks of its submissions
+    for venue_year, submissions in venue_years:
+        yield venue_year
+        chunk = []
+        for text in submissions:
+            chunk.append(text)
+            if len(chunk) == chunk_size:
+                yield venue_year["venue"], venue_year["year"], chunk, indent
+                chunk = []
+        if chunk:
+            yield venue_year["venue"], venue_year["year"], chunk, indent
+
+
+def __init_worker(level):
+    log = logging.getLogger("acceptance_tagging")
+    if not log.handlers:
+        log.addHandler(logging.StreamHandler())
+    log.setLevel(level)
+
+
+def __label_chunk(venue, year, texts, indent):
+    log = logging.getLogger("acceptance_tagging")
+    tagged = []
+    for text in texts:
+        submission = json.loads(text)
+        label_submission(submission, venue, year, log)
+        tagged.append(dumps_submission(submission, indent))
+    return tagged
+
+
 if __name__ == "__main__":
     log = logging.getLogger("acceptance_tagging")
     log.addHandler(logging.StreamHandler())
@@ -107,17 +279,18 @@ if __name__ == "__main__":
     parser.add_argument(
         "--write_new_file", "-w", help="Write the output in a new JSON with the given path. Otherwise the input file is overwritten"
     )
+    parser.add_argument(
+        "--processes", type=int, default=None, help="Number of worker processes. Default is the number of CPUs"
+    )
     parser.add_argument(
         "--logging_level", help="Logging level", default="INFO"
     )
     args = parser.parse_args()
     log.setLevel(logging.getLevelName(args.logging_level))
     if args.file:
-        with open(args.file, "r") as f:
-            json_file = json.load(f)
-            label = labeling(json_file,log)
-            if args.write_new_file:
-                with open(args.write_new_file, "w") as f:
-                    json.dump(json_file, f, indent=3)
-            else:
-                json.dump(json_file, f, indent=3)
+        # the file is streamed, tagged in parallel and written in one pass
+        new_file = args.write_new_file or args.file
+        with open(args.file, "rb") as f, open(new_file + ".tmp", "w") as out:
+            tagged = parallel_labeling(iter_venue_years(f, raw=True), log, args.processes)
+            dump_venue_years(((v, progressbar.progressbar(s)) for v, s in tagged), out, indent=3, serialized=True)
+        os.replace(new_file + ".tmp", new_file)
@@ -0,0 +1,136 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from crawler import load_previous_results, venue_years, skip_venue_year, store_venue_year, is_incremental, \
+    update_venue_year, download_group, uses_blob_store, get_invitations, get_notes, \
+    is_submission_invitation, iterget_references, index_references, submission_revisions, \
+    get_invitation_references, process_submission, attach_revisions, attach_notes, label_submissions
+
+
+def crawl_async(client, config, log, db=None, scheduler=None, writer=None, state=None):
+    '''
+    Crawl the configured venues like crawler.crawl, but venue years, invitations and their references
+    are fetched concurrently. At most config["crawl_concurrency"] requests are running at the same time.
+    The result has the same structure and order as the result of crawler.crawl.
+
+    :param client: the openreview client
+    :param config: the config dictionary
+    :param log: the configured logging client
+    :param db: the SQLDatabase if the output is stored in SQL
+    :param scheduler: the DownloadScheduler for the PDF downloads
+    :param writer: the JSONLinesWriter if each venue year is written as soon as it is finished
+    :param state: the CrawlState to resume an interrupted crawl
+    :return: the list of crawled venue years (empty if a writer is used)
+    '''
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(_crawl(client, config, log, db, scheduler, writer, state))
+    finally:
+        loop.close()
+
+
+async def _gather(*aws):
+    '''
+    Like asyncio.gather, but if one awaitable fails the others are cancelled and awaited before the error is raised,
+    so no request is scheduled after the crawl stopped and the first error is not hidden by the errors of the others
+    '''
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    try:
+        return await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _crawl(client, config, log, db, scheduler, writer, state):
+    concurrency = config.get("crawl_concurrency", 16)
+    semaphore = asyncio.Semaphore(concurrency)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    loop = asyncio.get_event_loop()
+
+    async def run(fn, *args):
+        # the openreview client is blocking, so every request is executed in the thread pool
+        async with semaphore:
+            return await loop.run_in_executor(executor, fn, *args)
+
+    async def crawl_and_store(venue, year, venue_id, invitations):
+        downloads = download_group(scheduler)
+        submissions = await _crawl_venue_year(client, config, log, venue, year, venue_id, db, downloads, state, run,
+                                              invitations)
+        venue_year = {"venue_id": venue_id, "venue": venue, "year": year, "submissions": submissions}
+        if writer is None:
+            return venue_year
+        if uses_blob_store(config) and downloads is not None:
+            # the hashes of the PDFs are only known after the download. The wait neither holds a thread
+            # of the requests nor a slot of the semaphore
+            await loop.run_in_executor(None, downloads.join)
+        # written as soon as it is finished, so it is not kept in memory
+        await run(store_venue_year, venue_year, results, config, log, writer, state, downloads)
+
+    results, already_done = load_previous_results(config, log, writer)
+    updates = []
+    todo = []
+    for venue, year, venue_id, invitations in venue_years(client, config, log, db):
+        if is_incremental(config, state) and "{} {}".format(venue, year) in already_done:
+            updates.append((venue, year, venue_id, invitations))
+        elif not skip_venue_year(venue, year, venue_id, results, already_done, log, writer):
+            todo.append((venue, year, venue_id, invitations))
+    try:
+        # incremental updates of already crawled venue years only request few notes, they run one after another
+        for venue, year, venue_id, invitations in updates:
+            await run(update_venue_year, client, config, log, venue, year, venue_id, results, db, scheduler, writer,
+                      state, invitations)
+        crawled = await _gather(*[crawl_and_store(*venue_year) for venue_year in todo])
+    finally:
+        executor.shutdown()
+    if writer is None:
+        results.extend(crawled)
+    return results
+
+
+async def _crawl_venue_year(client, config, log, venue, year, venue_id, db, scheduler, state, run, invitations=None):
+    log.info('Current Download: ' + venue + ' in ' + str(year))
+    venue_year = "{} {}".format(venue, year)
+    if invitations is None:
+        invitations = await run(get_invitations, client, venue, year)
+    invitations = list(invitations)
+    if not invitations:
+        log.debug('No data for ' + venue + ' in ' + str(year))
+    finished = {inv: state.invitation(venue_year, inv) for inv in invitations} if state is not None else {}
+    references = index_references(await _gather(*[run(iterget_references, client, inv, True)
+                                                  for inv in invitations
+                                                  if is_submission_invitation(inv) and finished.get(inv) is None]))
+
+    async def crawl_submission(n):
+        revisions, original_id = await run(submission_revisions, client, n, references, venue_year, log, state)
+        # process_submission may block on the download queue, so it does not run in the event loop
+        await run(process_submission, n, revisions, original_id, venue_id, config, scheduler, client, db, log, state)
+
+    async def crawl_invitation(inv):
+        notes = finished.get(inv)
+        if is_submission_invitation(inv):
+            if notes is None:
+                notes = await run(get_notes, client, inv)
+            await _gather(*[crawl_submission(n) for n in notes])
+        elif notes is None:
+            notes = await run(get_notes, client, inv)
+            attach_revisions(notes, await run(get_invitation_references, client, inv))
+        if state is not None and finished.get(inv) is None:
+            state.finish_invitation(venue_year, inv, notes)
+            state.update_watermark(venue_year, inv, notes)
+        return notes
+
+    # gather keeps the order of the invitations, so the result equals the sequential crawl
+    crawled = await _gather(*[crawl_invitation(inv) for inv in invitations])
+    submissions = []
+    other_notes = []
+    for inv, notes in zip(invitations, crawled):
+        if is_submission_invitation(inv):
+            submissions.extend(notes)
+        else:
+            other_notes.extend(notes)
+    attach_notes(submissions, other_notes, venue, year, log)
+    label_submissions(submissions, venue, year, config, log)
+    log.info('Finished: ' + venue + ' in ' + str(year))
+    return submissions
@@ -0,0 +1,66 @@
+"""
+Benchmark of the sequential crawl (crawler.crawl) and the concurrent crawl (async_crawler.crawl_async).
+
+Both crawl the same synthetic venue years from an in-memory fake client whose requests take a fixed latency,
+so the measured time is dominated by waiting for requests like against the OpenReview API.
+The submissions have no references in the bulk listing, so the references are requested per submission.
+Run from the repository root: python benchmarks/async_crawl.py
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+import warnings
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from async_crawler import crawl_async
+from crawler import crawl
+from tests.fake_client import FakeClient
+
+
+class PerSubmissionClient(FakeClient):
+    def get_references(self, referent=None, invitation=None, **kwargs):
+        if invitation is not None:
+            return []
+        return super().get_references(referent=referent, **kwargs)
+
+
+def config(venue_years, outdir, concurrency):
+    return {"targets": [{"venue": venue, "years": [year]} for venue, year in venue_years],
+            "outdir": outdir, "filename": "out.json", "output_json": True, "output_SQL": False,
+            "acceptance_labeling": False, "skip_pdf_download": True, "threaded_download": False,
+            "crawl_concurrency": concurrency}
+
+
+def measure(fn, client, config, log):
+    start = time.perf_counter()
+    result = fn(client, config, log)
+    return time.perf_counter() - start, result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--venue_years", type=int, default=4, help="Number of synthetic venue years")
+    parser.add_argument("--submissions", type=int, default=50, help="Submissions per venue year")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per request")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[4, 16, 64],
+                        help="Values of crawl_concurrency for the concurrent crawl")
+    args = parser.parse_args()
+    warnings.simplefilter("ignore", DeprecationWarning)
+    log = logging.getLogger("crawler")
+    log.setLevel(logging.WARNING)
+    venue_years = [("Venue{}.cc".format(i), 2020) for i in range(args.venue_years)]
+    outdir = tempfile.mkdtemp()
+
+    client = PerSubmissionClient(venue_years, args.submissions, args.latency)
+    sequential, expected = measure(crawl, client, config(venue_years, outdir, 1), log)
+    print("{:>12} {:>10} {:>10} {:>9}".format("crawl", "requests", "time [s]", "speedup"))
+    print("{:>12} {:>10} {:>10.2f} {:>9}".format("sequential", client.requests, sequential, "1.0x"))
+    for concurrency in args.concurrency:
+        client = PerSubmissionClient(venue_years, args.submissions, args.latency)
+        elapsed, result = measure(crawl_async, client, config(venue_years, outdir, concurrency), log)
+        assert result == expected, "the concurrent crawl differs from the sequential crawl"
+        print("{:>12} {:>10} {:>10.2f} {:>8.1f}x".format("async {}".format(concurrency), client.requests, elapsed,
+                                                         sequential / elapsed))
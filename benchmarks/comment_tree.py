@@ -0,0 +1,98 @@
+"""
+Microbenchmark for building the comment tree of a forum.
+
+Compares the previous leaf peeling (one pass over all remaining notes per tree level, each pass quadratic in the
+number of notes) with the id -> note map of comment_tree.create_comment_tree on synthetic forums:
+ - wide: many direct replies to the submission with short threads
+ - deep: a single long discussion thread
+Run from the repository root: python benchmarks/comment_tree.py
+"""
+import argparse
+import copy
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from comment_tree import create_comment_tree
+
+
+def wide_forum(n_notes, seed=0):
+    rnd = random.Random(seed)
+    notes = []
+    for i in range(n_notes):
+        replyto = "forum" if i < 10 or rnd.random() < 0.5 else "note{}".format(rnd.randrange(i))
+        notes.append({"id": "note{}".format(i), "forum": "forum", "replyto": replyto})
+    rnd.shuffle(notes)
+    return notes
+
+
+def deep_forum(n_notes):
+    notes = [{"id": "note{}".format(i), "forum": "forum", "replyto": "note{}".format(i - 1) if i else "forum"}
+             for i in range(n_notes)]
+    return notes[::-1]
+
+
+def create_comment_tree_before(forum_notes):
+    root_notes = []
+    leaf_notes = []
+    for note in forum_notes:
+        note["replies"] = []
+        if note["replyto"] == note["forum"]:
+            root_notes.append(note)
+        else:
+            leaf_notes.append(note)
+    stop = False
+    while not stop and len(leaf_notes) > 0:
+        children = [(note, any(n["replyto"] == note["id"] for n in leaf_notes)) for note in leaf_notes]
+        stop = not any(c for _, c in children)
+        for note, has_child in children:
+            if not has_child:
+                for parent in leaf_notes:
+                    if parent["id"] == note["replyto"]:
+                        parent["replies"].append(note)
+                        leaf_notes.remove(note)
+    for leaf in leaf_notes:
+        for r in root_notes:
+            if r["id"] == leaf["replyto"]:
+                r["replies"].append(leaf)
+    return root_notes
+
+
+def flatten(tree):
+    # (id, reply ids) of every note in pre-order, without recursion for deep threads
+    stack = list(reversed(tree))
+    nodes = []
+    while stack:
+        note = stack.pop()
+        nodes.append((note["id"], [r["id"] for r in note["replies"]]))
+        stack.extend(reversed(note["replies"]))
+    return nodes
+
+
+def measure(fn, notes):
+    start = time.perf_counter()
+    tree = fn(notes)
+    return time.perf_counter() - start, tree
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 500, 1000, 10000, 100000],
+                        help="Number of notes per synthetic forum")
+    parser.add_argument("--before_limit", type=int, default=1000,
+                        help="The previous version is only measured up to this number of notes")
+    args = parser.parse_args()
+
+    print("{:>6} {:>8} {:>14} {:>14}".format("forum", "notes", "before [s]", "after [s]"))
+    for size in args.sizes:
+        for name, notes in (("wide", wide_forum(size)), ("deep", deep_forum(size))):
+            after, tree = measure(create_comment_tree, copy.deepcopy(notes))
+            if size <= args.before_limit:
+                before, expected = measure(create_comment_tree_before, copy.deepcopy(notes))
+                assert flatten(expected) == flatten(tree)
+                before = "{:.4f}".format(before)
+            else:
+                before = "skipped"
+            print("{:>6} {:>8} {:>14} {:>14.4f}".format(name, size, before, after))
@@ -0,0 +1,118 @@
+"""
+Throughput benchmark for the acceptance labeling.
+
+Labels a crawl output (e.g. the full crawl) with the previous if/elif ladder and with the compiled rule table
+of acceptance_labeling.label_submission, checks that the tags are identical and reports submissions/s.
+Run from the repository root: python benchmarks/labeling.py -f {crawl.json}
+"""
+import argparse
+import copy
+import gc
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from acceptance_labeling import label_submission
+
+
+def label_submission_before(submission, venue, year, log):
+    if "withdraw" in submission["invitation"].lower():
+        submission["acceptance_tag"] = "withdrawn"
+        return
+    if "decision" in submission["content"]:
+        log.debug("{} has decision in content".format(submission["forum"]))
+        if "reject" in submission["content"]["decision"].lower() and "accept" in submission["content"]["decision"].lower():
+            log.debug("Forum {}. Tagged as unknown because decision is unclear. Decision: {}".format(
+                submission["forum"], submission["content"]["decision"]))
+            submission["acceptance_tag"] = "unknown"
+        elif "reject" in submission["content"]["decision"].lower():
+            submission["acceptance_tag"] = "rejected"
+        elif "accept" in submission["content"]["decision"].lower():
+            submission["acceptance_tag"] = "accepted"
+        elif not (venue == "ICLR.cc" and year == 2014):
+            log.debug("Forum {}. Tagged as accepted because not rejected. This might be wrong. Decision: {}".format(
+                submission["forum"], submission["content"]["decision"]))
+            submission["acceptance_tag"] = "accepted"
+        else:
+            submission["acceptance_tag"] = "unknown"
+    else:
+        for note in submission["notes"]:
+            if "desk_reject" in note["invitation"].lower():
+                log.debug("{} was desk rejected".format(submission["forum"]))
+                submission["acceptance_tag"] = "rejected"
+            if "decision" in note["invitation"].lower() or "acceptance" in note["invitation"].lower():
+                log.debug("{} has decision note".format(submission["forum"]))
+                for key in note["content"]:
+                    if "decision" in key.lower():
+                        if "reject" in note["content"][key].lower() and "accept" in note["content"][key].lower():
+                            log.debug("Forum {}. Tagged as unknown because decision is unclear. Decision: {}".format(
+                                submission["forum"], note["content"][key]))
+                            submission["acceptance_tag"] = "unknown"
+                        elif "reject" in note["content"][key].lower():
+                            submission["acceptance_tag"] = "rejected"
+                        elif "accept" in note["content"][key].lower():
+                            submission["acceptance_tag"] = "accepted"
+                        else:
+                            log.debug("Forum {}. Tagged as accepted because not rejected. This might be wrong. "
+                                      "Decision: {}".format(submission["forum"], note["content"][key]))
+                            submission["acceptance_tag"] = "accepted"
+                break
+            elif "meta" in note["invitation"].lower():
+                log.debug("{} has meta review note".format(submission["forum"]))
+                try:
+                    if "reject" in note["content"]["recommendation"].lower():
+                        submission["acceptance_tag"] = "rejected"
+                    elif "accept" in note["content"]["recommendation"].lower():
+                        submission["acceptance_tag"] = "accepted"
+                    else:
+                        submission["acceptance_tag"] = "unknown"
+                        log.debug("Forum {}. Meta review without decision".format(submission["forum"]))
+                except KeyError:
+                    submission["acceptance_tag"] = "unknown"
+                    log.debug("Forum {}. Unexpected format of a meta review note.".format(submission["forum"]))
+    if "acceptance_tag" not in submission:
+        log.debug("Forum {}. No decision could be found.".format(submission["forum"]))
+        submission["acceptance_tag"] = "unknown"
+
+
+def measure(fn, venue_years, log, runs=5):
+    # best of several runs, the garbage collector is paused while measuring
+    best = None
+    gc.disable()
+    for _ in range(runs):
+        start = time.perf_counter()
+        count = 0
+        for venue_year in venue_years:
+            for submission in venue_year["submissions"]:
+                fn(submission, venue_year["venue"], venue_year["year"], log)
+                count += 1
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    gc.enable()
+    return count, best
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", default="example_output.json", help="JSON created by crawler.py")
+    parser.add_argument("--repeat", type=int, default=1, help="Label the submissions of the file this many times")
+    args = parser.parse_args()
+    log = logging.getLogger("acceptance_tagging")
+
+    with open(args.file, "r") as f:
+        venue_years = json.load(f) * args.repeat
+    for venue_year in venue_years:
+        for submission in venue_year["submissions"]:
+            submission.pop("acceptance_tag", None)
+    before_data = copy.deepcopy(venue_years)
+
+    count, before = measure(label_submission_before, before_data, log)
+    count, after = measure(label_submission, venue_years, log)
+    assert [s["acceptance_tag"] for v in before_data for s in v["submissions"]] == \
+           [s["acceptance_tag"] for v in venue_years for s in v["submissions"]]
+    print("{} submissions".format(count))
+    print("before: {:.0f} submissions/s".format(count / before))
+    print("after:  {:.0f} submissions/s".format(count / after))
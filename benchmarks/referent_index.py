@@ -0,0 +1,56 @@
+"""
+Microbenchmark for attaching the revisions of an invitation to its notes.
+
+Compares the previous list comprehension per note (O(notes x revisions)) with the referent index of
+crawler.attach_revisions (O(notes + revisions)) on synthetic invitations.
+Run from the repository root: python benchmarks/referent_index.py
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from crawler import attach_revisions
+
+
+def synthetic_invitation(n_notes, revisions_per_note=2, seed=0):
+    rnd = random.Random(seed)
+    notes = [{"id": "note{}".format(i), "forum": "forum{}".format(i % 1000)} for i in range(n_notes)]
+    revisions = [{"id": "rev{}".format(i), "referent": "note{}".format(rnd.randrange(n_notes))}
+                 for i in range(n_notes * revisions_per_note)]
+    return notes, revisions
+
+
+def attach_revisions_quadratic(notes, revisions):
+    for note in notes:
+        note["revisions"] = [r for r in revisions if r["referent"] == note["id"]]
+
+
+def measure(fn, notes, revisions):
+    start = time.perf_counter()
+    fn(notes, revisions)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 5000, 10000, 100000],
+                        help="Number of notes per synthetic invitation")
+    parser.add_argument("--quadratic_limit", type=int, default=10000,
+                        help="The quadratic version is only measured up to this number of notes")
+    args = parser.parse_args()
+
+    print("{:>8} {:>14} {:>14}".format("notes", "before [s]", "after [s]"))
+    for size in args.sizes:
+        notes, revisions = synthetic_invitation(size)
+        after = measure(attach_revisions, notes, revisions)
+        expected = [n["revisions"] for n in notes]
+        if size <= args.quadratic_limit:
+            before = measure(attach_revisions_quadratic, notes, revisions)
+            assert expected == [n["revisions"] for n in notes]
+            before = "{:.4f}".format(before)
+        else:
+            before = "skipped"
+        print("{:>8} {:>14} {:>14.4f}".format(size, before, after))
@@ -0,0 +1,139 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import openreview
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_blob_store(root):
+    '''
+    :return: the shared BlobStore of a folder, it is created on the first call
+    '''
+    root = os.path.abspath(root)
+    with _stores_lock:
+        if root not in _stores:
+            _stores[root] = BlobStore(root)
+        return _stores[root]
+
+
+class BlobStore:
+    '''
+    Content addressed store for the PDFs. Each distinct file is stored once under its SHA-256 hash:
+
+        {root}/{sha256[:2]}/{sha256}.pdf
+
+    An index (refs.sqlite) maps each OpenReview reference id to the hash and size of its PDF,
+    so identical PDFs of different revisions are only stored once.
+    '''
+
+    def __init__(self, root):
+        self.root = root
+        if not os.path.exists(root):
+            os.makedirs(root, exist_ok=True)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(os.path.join(root, "refs.sqlite"), check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS refs (id TEXT PRIMARY KEY, sha256 TEXT, size INTEGER)")
+
+    def path(self, sha256):
+        return os.path.join(self.root, sha256[:2], sha256 + ".pdf")
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put(self, chunks):
+        '''
+        Stream a file into the store. It is written to a temporary file while it is hashed, so it is never
+        held in memory as a whole. If the same content is already stored, the temporary file is dropped.
+        :param chunks: iterable of bytes
+        :return: (sha256, size)
+        '''
+        sha = hashlib.sha256()
+        size = 0
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            sha256 = sha.hexdigest()
+            if self.exists(sha256):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(self.path(sha256)), exist_ok=True)
+                os.replace(tmp, self.path(sha256))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        return sha256, size
+
+    def ref(self, ref_id):
+        '''
+        :return: (sha256, size) of the PDF of a reference or None if it is not stored
+        '''
+        with self.lock:
+            row = self.connection.execute("SELECT sha256, size FROM refs WHERE id = ?", (ref_id,)).fetchone()
+        return tuple(row) if row else None
+
+    def cached(self, ref_id):
+        '''
+        Look up a reference and check that its file is stored with the right size. Counts cache hits and misses.
+        :return: (sha256, size) or None if the PDF has to be downloaded
+        '''
+        stored = self.ref(ref_id)
+        valid = stored is not None and self.exists(stored[0]) and os.path.getsize(self.path(stored[0])) == stored[1]
+        with self.lock:
+            if valid:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return stored if valid else None
+
+    def log_stats(self, log):
+        log.info("PDF cache: {} hits, {} misses".format(self.hits, self.misses))
+
+    def add_ref(self, ref_id, sha256, size):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO refs VALUES (?, ?, ?)", (ref_id, sha256, size))
+
+
+def request_pdf(client, ref_id, headers=None):
+    '''
+    Start a streamed request for the PDF of a reference
+    :param headers: additional headers, e.g. for conditional requests
+    :return: the response, its body is not read yet
+    '''
+    url = getattr(client, "pdf_revisions_url", client.baseurl + "/references/pdf")
+    request_headers = client.headers.copy()
+    request_headers['content-type'] = 'application/pdf'
+    request_headers.update(headers or {})
+    return client.session.get(url, params={'id': ref_id}, headers=request_headers, stream=True)
+
+
+def raise_for_pdf_status(response):
+    '''
+    :raises openreview.OpenReviewException: like client.get_pdf if the request failed (e.g. the reference has no pdf)
+    '''
+    if response.status_code >= 400:
+        raise openreview.OpenReviewException({'name': 'Error', 'message': response.reason,
+                                              'status': response.status_code})
+
+
+def iter_pdf(client, ref_id, chunk_size=1 << 16):
+    '''
+    Stream the PDF of a reference from OpenReview instead of loading it into memory like client.get_pdf
+    :return: generator of bytes chunks
+    :raises openreview.OpenReviewException: if the reference has no pdf
+    '''
+    with request_pdf(client, ref_id) as response:
+        raise_for_pdf_status(response)
+        for chunk in response.iter_content(chunk_size):
+            yield chunk
@@ -0,0 +1,88 @@
+import copy
+import threading
+import requests
+from rate_limit import install as install_rate_limit
+
+
+class ClientPool:
+    '''
+    One openreview.Client per thread, each with its own requests session and keep-alive connections.
+    The pool is used in place of the client: attributes and methods are looked up on the client of the calling thread,
+    so the download workers (and the threads of the async crawl) never share a session.
+    The thread which creates the pool keeps the given client.
+
+    The clients reuse the login token of the given client instead of logging in again and all of them send their requests
+    through the same rate limiter and retry ledger.
+    '''
+
+    def __init__(self, client, limiter, ledger=None, policy=None, pool_maxsize=2):
+        '''
+        :param client: the logged in client, the rate limiter is already installed on it
+        :param policy: dict call type -> (retries, backoff) which overrides RETRY_POLICY
+        :param pool_maxsize: kept-alive connections per host of each client. A thread sends one request at a time,
+                             the second connection covers a streamed PDF which is not closed yet
+        '''
+        self.client = client
+        self.limiter = limiter
+        self.ledger = ledger
+        self.policy = policy
+        self.pool_maxsize = pool_maxsize
+        self.local = threading.local()
+        self.local.client = client
+        self.lock = threading.Lock()
+        self.clients = [client]
+
+    def get(self):
+        '''
+        :return: the client of the calling thread, it is created on the first call of the thread
+        '''
+        client = getattr(self.local, "client", None)
+        if client is None:
+            client = self.__new_client()
+            self.local.client = client
+            with self.lock:
+                self.clients.append(client)
+        return client
+
+    def __getattr__(self, name):
+        # only called for attributes which are not set in __init__
+        return getattr(self.get(), name)
+
+    def __new_client(self):
+        # a copy instead of a new openreview.Client: its constructor logs in (with OPENREVIEW_USERNAME in the
+        # environment) or requests the profile (with a token), both without the rate limiter
+        client = copy.copy(self.client)
+        client.session = requests.Session()
+        client.headers = dict(self.client.headers)
+        return install_rate_limit(client, self.limiter, self.ledger, self.policy, pool_maxsize=self.pool_maxsize)
+
+    def connection_stats(self):
+        '''
+        :return: (number of clients, requests, opened connections) over the connection pools of all clients
+        '''
+        with self.lock:
+            clients = list(self.clients)
+        requests = connections = 0
+        for client in clients:
+            for adapter in set(client.session.adapters.values()):
+                pools = adapter.poolmanager.pools
+                for key in pools.keys():
+                    pool = pools.get(key)
+                    if pool is not None:
+                        requests += pool.num_requests
+                        connections += pool.num_connections
+        return len(clients), requests, connections
+
+    def log_stats(self, log):
+        clients, requests, connections = self.connection_stats()
+        log.info("Client pool: {} clients, {} requests over {} connections ({:.0%} reused)".format(
+            clients, requests, connections, 1 - connections / requests if requests else 0))
+
+    def close(self):
+        '''
+        Close the sessions of the clients created by the pool
+        '''
+        with self.lock:
+            clients, self.clients = self.clients[1:], self.clients[:1]
+        for client in clients:
+            client.session.close()
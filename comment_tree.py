@@ -2,37 +2,43 @@ import json
 import argparse
 import os
 import logging
+from json_stream import iter_venue_years, dump_venue_years
+from forum_index import ForumIndex
+
+log = logging.getLogger("comment_tree")
 
 
 def comment_tree(file):
     """
     Transform a given output from crawler.py into a similar version that has comments to submissions
     nested as replies instead of in a flat structure. Replies to replies may occur.
+    The file is streamed: it is read and written in one pass with one submission in memory at a time.
     :param file: path to json file, conforms to crawler.py output
     """
-    with open(file, "r") as f:
-        jfile = json.load(f)
-    results = []
+    new_file_name = os.path.splitext(file)[0] + "_comment_tree.json"
     log.info("Transforming file %s to comment tree structure", file)
-    for v in jfile:
-        venue = v["venue"]
-        year = v["year"]
-        submissions = []
-        for sub in v["submissions"]:
-            tree_notes = create_comment_tree(sub["notes"])
-            sub["notes"] = tree_notes
-            submissions.append(sub)
-        results.append({"venue": venue, "year": year, "submissions": submissions})
+    with open(file, "rb") as f, open(new_file_name + ".tmp", 'w') as new_file:
+        venue_years = (({"venue": v["venue"], "year": v["year"]}, __tree_submissions(submissions))
+                       for v, submissions in iter_venue_years(f))
+        dump_venue_years(venue_years, new_file, indent=3)
+    os.replace(new_file_name + ".tmp", new_file_name)
+    log.info("Written new file %s", new_file_name)
+
 
-        with open(os.path.splitext(file)[0] + "_comment_tree.json", 'w') as new_file:
-            json.dump(results, new_file, indent=3)
-            log.info("Written new file %s_comment_tree.json", os.path.splitext(file)[0])
+def __tree_submissions(submissions):
+    for sub in submissions:
+        sub["notes"] = create_comment_tree(sub["notes"])
+        yield sub
 
 
 def create_comment_tree(forum_notes):
     """
     Create a tree structure for 1 Forum, given the notes in that forum.
     Return a list of notes which are parent/root notes.
+    The tree is built with an id -> note map in one pass over the notes.
+    Replies to a root note keep the order of forum_notes. Replies to other notes are ordered by the depth of their own
+    reply thread (shortest first) and then by the order of forum_notes.
+    Notes whose parent is missing (orphans) and reply cycles are left out.
     param forum_notes: list of notes for 1 forum
     """
     root_notes = []
@@ -46,72 +52,76 @@ def create_comment_tree(forum_notes):
         else:
             # if note is not a root, it will be in the remaining tree
             leaf_notes.append(note)
-    stop = False
-    # check in each iteration if there are still children not attached
-    # new leaf_notes are subtrees where children are already appended
-    while not stop and leaf_notes:
-        children, stop = __has_children(leaf_notes)
-        leaf_notes = __insert_children(children)
+
+    leaf_by_id = {}
+    for note in leaf_notes:
+        leaf_by_id.setdefault(note["id"], note)
+    children = {}
+    top_notes = []
+    for note in leaf_notes:
+        if note["replyto"] in leaf_by_id:
+            children.setdefault(note["replyto"], []).append(note)
+        else:
+            # direct reply to a root or an orphan
+            top_notes.append(note)
+
+    heights = __reply_heights(leaf_notes, children)
+    for parent, replies in children.items():
+        leaf_by_id[parent]["replies"] = sorted(replies, key=lambda n: heights[n["id"]])
 
     # attach all subtrees to the roots (lone leafs are left out, assume mistake in crawling)
-    for leaf in leaf_notes:
-        for r in root_notes:
-            if r["id"] == leaf["replyto"]:
-                r["replies"].append(leaf)
+    roots_by_id = {}
+    for r in root_notes:
+        roots_by_id.setdefault(r["id"], []).append(r)
+    for note in top_notes:
+        if note["replyto"] in roots_by_id:
+            for r in roots_by_id[note["replyto"]]:
+                r["replies"].append(note)
+        else:
+            log.debug("Note %s has no parent %s in forum %s", note["id"], note["replyto"], note["forum"])
     return root_notes
 
 
-def __has_children(notes):
-    # check if there are still children left to be appended
-    children = []
-    # if there are no more lone children, stop
-    stop = True
+def __reply_heights(notes, children):
+    # height of the reply thread below each note (0 = no replies). Iterative, so deep threads do not hit the
+    # recursion limit. A reply cycle can never be reached from a root, it is only reported and cut.
+    heights = {}
     for note in notes:
-        c = False
-        for n in notes:
-            if note["id"] == n["replyto"]:
-                # label child as "hasChild = true"
-                c = True
-                # as long as one note is a child, do not stop
-                stop = False
-        children.append((note, c))
-    return children, stop
-
-
-def __insert_children(children):
-    # insert children that are tagged to be inserted
-    combined_notes = [child[0] for child in children]
-    for child in children:
-        # if no more children, insert at parent -> assume is last comment
-        if not child[1]:
-            # find parent and append
-            for note in combined_notes:
-                if note["id"] == child[0]["replyto"]:
-                    note["replies"].append(child[0])
-                    combined_notes.remove(child[0])
-    return combined_notes
+        if note["id"] in heights:
+            continue
+        stack = [(note["id"], False)]
+        path = set()
+        while stack:
+            note_id, expanded = stack.pop()
+            if expanded:
+                path.discard(note_id)
+                heights[note_id] = max([heights.get(c["id"], -1) + 1 for c in children.get(note_id, [])], default=0)
+                continue
+            if note_id in heights:
+                continue
+            path.add(note_id)
+            stack.append((note_id, True))
+            for c in children.get(note_id, []):
+                if c["id"] in path:
+                    log.warning("Reply cycle at note %s in forum %s", c["id"], c["forum"])
+                elif c["id"] not in heights:
+                    stack.append((c["id"], False))
+    return heights
 
 
 def __find_forum(file, name):
-    # find the notes to a forum by its name
+    # find the notes to a forum by its name in the forum index of the file
     # assumes the name is a unique forum ID in the file
-    with open(file, "r") as f:
-        jfile = json.load(f)
-    sub = None
-    forum_notes = []
-    for venue in jfile:
-        for submission in venue["submissions"]:
-            if submission["forum"] == name:
-                forum_notes = submission["notes"]
-                sub = submission
-                break
+    index = ForumIndex(file, log)
+    sub = index.submission(name)
+    index.close()
 
     if sub is None:
         log.error("No forum named %s found.", name)
         exit()
     else:
         # create tree structure notes for the forum
-        tree_notes = create_comment_tree(forum_notes)
+        tree_notes = create_comment_tree(sub["notes"])
         # return submission and tree structured notes
         return sub, tree_notes
 
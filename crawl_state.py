@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import threading
+
+
+class CrawlState:
+    '''
+    Persistent state of a crawl in a SQLite file, so a restarted crawl can skip the work which is already done.
+
+    It records
+     - the notes of finished invitations of the current venue years
+     - the revisions and the original reference of processed submissions
+     - the downloaded PDFs
+     - the modification time (tmdate) high-water mark of each invitation for the incremental crawl
+
+    Invitations and submissions are forgotten once their venue year is finished. From then on the output
+    (JSON or manifest) decides if a venue year is skipped. The downloaded PDFs are kept because a reference never changes.
+    A new high-water mark only becomes valid once its venue year is finished, so an interrupted incremental crawl
+    requests the same changes again.
+    '''
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        # the state is shared by the crawl and the download threads
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS invitations "
+                                    "(venue_year TEXT, invitation TEXT, notes TEXT, PRIMARY KEY (venue_year, invitation))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS submissions "
+                                    "(id TEXT PRIMARY KEY, venue_year TEXT, revisions TEXT, original TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pdfs (id TEXT PRIMARY KEY)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS watermarks "
+                                    "(invitation TEXT PRIMARY KEY, venue_year TEXT, tmdate INTEGER, pending INTEGER)")
+
+    def invitation(self, venue_year, invitation):
+        '''
+        :return: the notes of a finished invitation or None
+        '''
+        row = self.__fetch("SELECT notes FROM invitations WHERE venue_year = ? AND invitation = ?",
+                           (venue_year, invitation))
+        return json.loads(row[0]) if row else None
+
+    def finish_invitation(self, venue_year, invitation, notes):
+        self.__execute("INSERT OR REPLACE INTO invitations VALUES (?, ?, ?)",
+                       (venue_year, invitation, json.dumps(notes)))
+
+    def submission(self, submission_id):
+        '''
+        :return: (revisions, id of the original reference) of a processed submission or None
+        '''
+        row = self.__fetch("SELECT revisions, original FROM submissions WHERE id = ?", (submission_id,))
+        return (json.loads(row[0]), row[1]) if row else None
+
+    def finish_submission(self, venue_year, submission_id, revisions, original_id):
+        self.__execute("INSERT OR REPLACE INTO submissions VALUES (?, ?, ?, ?)",
+                       (submission_id, venue_year, json.dumps(revisions), original_id))
+
+    def pdf_done(self, pdf_id):
+        return self.__fetch("SELECT 1 FROM pdfs WHERE id = ?", (pdf_id,)) is not None
+
+    def finish_pdf(self, pdf_id):
+        self.__execute("INSERT OR IGNORE INTO pdfs VALUES (?)", (pdf_id,))
+
+    def watermark(self, invitation):
+        '''
+        :return: the highest tmdate of the notes of an invitation in the output or None
+        '''
+        row = self.__fetch("SELECT tmdate FROM watermarks WHERE invitation = ?", (invitation,))
+        return row[0] if row else None
+
+    def update_watermark(self, venue_year, invitation, notes):
+        '''
+        Raise the high-water mark of an invitation to the highest tmdate of the given notes
+        '''
+        tmdates = [n["tmdate"] for n in notes if n.get("tmdate") is not None]
+        if not tmdates:
+            return
+        self.__execute("INSERT OR IGNORE INTO watermarks VALUES (?, ?, NULL, NULL)", (invitation, venue_year))
+        self.__execute("UPDATE watermarks SET pending = MAX(COALESCE(pending, 0), COALESCE(tmdate, 0), ?) "
+                       "WHERE invitation = ?", (max(tmdates), invitation))
+
+    def finish_venue_year(self, venue_year):
+        '''
+        Forget the invitations and submissions of a finished venue year and commit its high-water marks
+        '''
+        self.__execute("DELETE FROM invitations WHERE venue_year = ?", (venue_year,))
+        self.__execute("DELETE FROM submissions WHERE venue_year = ?", (venue_year,))
+        self.__execute("UPDATE watermarks SET tmdate = pending, pending = NULL "
+                       "WHERE venue_year = ? AND pending IS NOT NULL", (venue_year,))
+
+    def clear(self):
+        '''
+        Forget all invitations and submissions and commit all high-water marks, e.g. when the whole output is written
+        '''
+        self.__execute("DELETE FROM invitations", ())
+        self.__execute("DELETE FROM submissions", ())
+        self.__execute("UPDATE watermarks SET tmdate = pending, pending = NULL WHERE pending IS NOT NULL", ())
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
+
+    def __fetch(self, query, params):
+        with self.lock:
+            return self.connection.execute(query, params).fetchone()
+
+    def __execute(self, query, params):
+        with self.lock, self.connection:
+            self.connection.execute(query, params)
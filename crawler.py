@@ -1,37 +1,81 @@
 import argparse
 import json
 import os
-from datetime import date
 import re
 import openreview
 import logging
 import sys
 import progressbar
-import threading
 from database.database import SQLDatabase
-from acceptance_labeling import labeling
-import time
-import copy
-def crawl(client, config, log, db=None):
+from download_scheduler import DownloadScheduler
+from output_writer import JSONLinesWriter
+from crawl_state import CrawlState
+from incremental import merge_venue_year
+from blob_store import get_blob_store, iter_pdf
+from pdf_cache import get_pdf_cache
+from rate_limit import TokenBucket, RetryLedger, install as install_rate_limit
+from client_pool import ClientPool
+from acceptance_labeling import label_submission
+
+def crawl(client, config, log, db=None, scheduler=None, writer=None, state=None):
     '''
     This method crawls the configured venues and saves all comments and all PDF Revisions to the output folder.
 
     :param client: the openreview client
     :param config: the config dictionary
     :param log: the configured logging client
-    :return: Nothing
+    :param db: the SQLDatabase if the output is stored in SQL
+    :param scheduler: the DownloadScheduler for the PDF downloads
+    :param writer: the JSONLinesWriter if each venue year is written as soon as it is finished
+    :param state: the CrawlState to resume an interrupted crawl
+    :return: the list of crawled venue years (empty if a writer is used)
+    '''
+    results, already_done = load_previous_results(config, log, writer)
+    for venue, year, venue_id, invitations in venue_years(client, config, log, db):
+        if is_incremental(config, state) and "{} {}".format(venue, year) in already_done:
+            update_venue_year(client, config, log, venue, year, venue_id, results, db, scheduler, writer, state,
+                              invitations)
+            continue
+        if skip_venue_year(venue, year, venue_id, results, already_done, log, writer):
+            continue
+        log.info('Current Download: '+ venue+' in '+str(year))
+        downloads = download_group(scheduler)
+        submissions = crawl_venue_year(client, config, log, venue, year, venue_id, db, downloads, state, invitations)
+        store_venue_year({"venue_id": venue_id, "venue": venue, "year": year, "submissions": submissions},
+                         results, config, log, writer, state, downloads)
+
+    return results
+
+
+def load_previous_results(config, log, writer=None):
+    '''
+    Load the output of a previous run so already crawled venue years can be skipped.
+    With a writer only its manifest is read.
+    :return: (list of previous venue years, set of "venue year" strings which are done)
     '''
-    threads = list()
-    already_done = set([])
-    sql_venue_to_id ={}
     results = []
-    venue_id = 0
-    if config["output_json"]:
+    already_done = set([])
+    if writer is not None:
+        already_done = writer.done()
+    elif config["output_json"]:
         if os.path.exists(os.path.join(config["outdir"], config["filename"])):
             with open(os.path.join(config["outdir"], config["filename"]), 'r') as file_handle:
                 log.debug('Previous file successfully loaded')
                 results = json.load(file_handle)
                 already_done = set(["{} {}".format(r["venue"], r["year"]) for r in results])
+    return results, already_done
+
+
+def venue_years(client, config, log, db=None):
+    '''
+    Generate all configured venue years together with their venue id.
+    Venues which already exist in the database keep their id.
+    The years of a venue with years "all" are the years which have invitations, see discover_years.
+    :return: generator of (venue, year, venue_id, invitations), the merged invitations are only known for
+             discovered years, otherwise they are None
+    '''
+    sql_venue_to_id = {}
+    venue_id = 0
     if config["output_SQL"]:
         venues = db.get_venues()
         if venues:
@@ -40,8 +84,10 @@ def crawl(client, config, log, db=None):
 
     for target in config["targets"]:
         venue, years = target["venue"], target["years"]
+        discovered = {}
         if years == "all":
-            years = range(2000, date.today().year + 2)
+            discovered = discover_years(client, venue, log)
+            years = sorted(discovered)
         for year in years:
             if "{} {}".format(venue, year) in sql_venue_to_id:
                 log.debug("Override Venue "+"{} {}".format(venue, year)+" from Database")
@@ -51,97 +97,426 @@ def crawl(client, config, log, db=None):
                     venue_id += 1
                 sql_venue_to_id["{} {}".format(venue, year)]=venue_id
                 log.debug("New Venue " + "{} {}".format(venue, year)+" ID: "+str(venue_id))
-            if "{} {}".format(venue, year) in already_done:
-                log.info("Skipping {} {}. Already done".format(venue, year))
-                for r in results:
-                    if r["year"] == year and r["venue"] == venue and r["venue_id"] != venue_id:
-                        log.info("Updating Venue ID: {} changed to {}".format(r["venue_id"], venue_id))
-                        r["venue_id"] = venue_id
-                continue
-            log.info('Current Download: '+ venue+' in '+str(year))
-
-            invitations_iterator = openreview.tools.iterget_invitations(client, regex="{}/{}/".format(venue, year), expired=True)
-            invitations = [inv.id for inv in invitations_iterator]
-            invitations = merge_invitations(invitations)
-            submissions = []
-            if not invitations:
-                log.debug('No data for '+ venue+' in '+str(year))
-            else:
-                forum_idx_map = {}
-                other_notes = []
-                for inv in progressbar.progressbar(invitations):
-                    notes = [note.to_json() for note in openreview.tools.iterget_notes(client, invitation=inv)]
-                    if "submission" in inv.lower():
-                        # this is a bit of a hack but there is no general submission invitation but all submission invitations
-                        # contain at least (S|s)ubmission somewhere
-                        # check https://openreview-py.readthedocs.io/en/latest/get_submission_invitations.html to verify
-                        log.debug("Submission invitation")
-                        forum_idx_map.update({n["forum"]: i+len(submissions) for i, n in enumerate(notes)})
-                        threads = list()
-                        for n in progressbar.progressbar(notes):
-                            try:
-                                refs = client.get_references(n["id"], original=True)
-                            except:
-                                log.error("Request Error for ID: "+str(n["id"]))
-                            references=[r.to_json() for r in refs[1:]]
-                            n["revisions"] = references
-                            n["notes"] = []
-                            if len(refs) > 0 :
-                                #print(refs[0].to_json()['content'].keys())
-                                if "pdf" in  refs[0].to_json()['content'].keys():
-                                    original = refs[:1][0]
-                                    if not config["skip_pdf_download"]:
-                                        download_manager(n, original, venue_id, references, threads)
-                        submissions.extend(notes)
-                    else:
-                        revisions = [r.to_json() for r in client.get_references(invitation=inv)]
-                        for note in notes:
-                            note["revisions"] = [r for r in revisions if r["referent"] == note["id"]]
-                        other_notes.extend(notes)
-            if not submissions:
-                log.warning('No submissions found for '+ venue+' in '+str(year))
+            yield venue, year, venue_id, discovered.get(year)
+
+
+def skip_venue_year(venue, year, venue_id, results, already_done, log, writer=None):
+    '''
+    Check if a venue year is already done and update its venue id in the previous results
+    :return: True if the venue year should be skipped
+    '''
+    if "{} {}".format(venue, year) not in already_done:
+        return False
+    log.info("Skipping {} {}. Already done".format(venue, year))
+    if writer is not None:
+        writer.set_venue_id(venue, year, venue_id, log)
+    for r in results:
+        if r["year"] == year and r["venue"] == venue and r["venue_id"] != venue_id:
+            log.info("Updating Venue ID: {} changed to {}".format(r["venue_id"], venue_id))
+            r["venue_id"] = venue_id
+    return True
+
+
+def is_incremental(config, state):
+    # the high-water marks of the incremental crawl are stored in the CrawlState
+    return config.get("incremental", False) and state is not None
+
+
+def update_venue_year(client, config, log, venue, year, venue_id, results, db=None, scheduler=None, writer=None,
+                      state=None, invitations=None):
+    '''
+    Incremental crawl of an already crawled venue year. Only the notes which were modified since the last crawl
+    are requested and merged into the previous output.
+    :param invitations: the merged invitations of the venue year if they are known, see venue_years
+    '''
+    log.info('Updating: '+ venue+' in '+str(year))
+    if writer is not None:
+        previous = writer.read([v for v in writer.venue_years if v["venue"] == venue and v["year"] == year][0])
+    else:
+        previous = [r for r in results if r["venue"] == venue and r["year"] == year][0]
+    previous["venue_id"] = venue_id
+    downloads = download_group(scheduler)
+    submissions, notes = crawl_venue_year_delta(client, config, log, venue, year, venue_id, db, downloads, state,
+                                                invitations)
+    log.info('{} changed submissions and {} changed notes in {} {}'.format(len(submissions), len(notes), venue, year))
+    merge_venue_year(previous, submissions, notes, log)
+    # the merge removes the tags of changed submissions
+    label_submissions(previous["submissions"], venue, year, config, log)
+    if writer is not None:
+        store_venue_year(previous, results, config, log, writer, state, downloads)
+
+
+def download_group(scheduler):
+    '''
+    :return: a DownloadGroup of the scheduler for the PDFs of one venue year, None without scheduler
+    '''
+    return scheduler.group() if scheduler is not None else None
+
+
+def crawl_venue_year_delta(client, config, log, venue, year, venue_id, db, scheduler, state, invitations=None):
+    '''
+    Request the notes of a venue year which were modified since the high-water mark of their invitation
+    :return: (changed submissions with all their revisions, changed notes with their new revisions)
+    '''
+    venue_year = "{} {}".format(venue, year)
+    submissions = []
+    other_notes = []
+    if invitations is None:
+        invitations = get_invitations(client, venue, year)
+    for inv in invitations:
+        since = state.watermark(inv)
+        notes = get_notes_since(client, inv, since)
+        if is_submission_invitation(inv):
+            for n in notes:
+                # only few submissions change, so their revisions are requested one by one
+                revisions, original_id = submission_revisions(client, n, {}, venue_year, log)
+                process_submission(n, revisions, original_id, venue_id, config, scheduler, client, db, log, state)
+            submissions.extend(notes)
+        else:
+            attach_revisions(notes, get_invitation_references(client, inv, since))
+            other_notes.extend(notes)
+        state.update_watermark(venue_year, inv, notes)
+    return submissions, other_notes
+
+
+def store_venue_year(venue_year, results, config, log, writer=None, state=None, downloads=None):
+    '''
+    Keep a finished venue year in the results or write it directly with the writer.
+    :param downloads: the DownloadGroup of the PDFs of the venue year
+    '''
+    if writer is None:
+        results.append(venue_year)
+        return
+    if uses_blob_store(config) and downloads is not None:
+        # the hashes of the PDFs are only known after the download, the other venue years are not waited for
+        downloads.join()
+    writer.write(venue_year)
+    if state is not None:
+        state.finish_venue_year("{} {}".format(venue_year["venue"], venue_year["year"]))
+    log.info('Written {} {}'.format(venue_year["venue"], venue_year["year"]))
+
+
+def crawl_venue_year(client, config, log, venue, year, venue_id, db=None, scheduler=None, state=None,
+                     invitations=None):
+    '''
+    Crawl all invitations of one venue year.
+    With a CrawlState, finished invitations and processed submissions of an interrupted crawl are not requested again.
+    :param invitations: the merged invitations of the venue year if they are known, see venue_years
+    :return: list of submissions with their revisions and notes
+    '''
+    venue_year = "{} {}".format(venue, year)
+    if invitations is None:
+        invitations = get_invitations(client, venue, year)
+    submissions = []
+    other_notes = []
+    if not invitations:
+        log.debug('No data for '+ venue+' in '+str(year))
+    else:
+        finished = {inv: state.invitation(venue_year, inv) for inv in invitations} if state is not None else {}
+        # the references of all submissions are requested page wise per invitation instead of once per submission
+        references = index_references(iterget_references(client, inv, original=True)
+                                      for inv in invitations
+                                      if is_submission_invitation(inv) and finished.get(inv) is None)
+        for inv in progressbar.progressbar(invitations):
+            notes = finished.get(inv)
+            if notes is not None:
+                log.debug("Invitation {} already done".format(inv))
+            if is_submission_invitation(inv):
+                log.debug("Submission invitation")
+                if notes is None:
+                    notes = get_notes(client, inv)
+                for n in progressbar.progressbar(notes):
+                    revisions, original_id = submission_revisions(client, n, references, venue_year, log, state)
+                    process_submission(n, revisions, original_id, venue_id, config, scheduler, client, db, log, state)
+                submissions.extend(notes)
             else:
-                for note in other_notes:
-                    try:
-                        submissions[forum_idx_map[note["forum"]]]["notes"].append(note)
-                    except KeyError:
-                        log.debug("No submission found for note "+note["id"]+" in forum "+note["forum"])
-            results.append({"venue_id":sql_venue_to_id["{} {}".format(venue, year)],"venue": venue, "year": year, "submissions": submissions})
+                if notes is None:
+                    notes = get_notes(client, inv)
+                    attach_revisions(notes, get_invitation_references(client, inv))
+                other_notes.extend(notes)
+            if state is not None and finished.get(inv) is None:
+                state.finish_invitation(venue_year, inv, notes)
+                state.update_watermark(venue_year, inv, notes)
+    attach_notes(submissions, other_notes, venue, year, log)
+    label_submissions(submissions, venue, year, config, log)
+    return submissions
+
+
+def discover_years(client, venue, log):
+    '''
+    Request all invitations of a venue in one listing and partition them by the year in their id (venue/year/...),
+    instead of requesting the invitations of every possible year.
+    :return: dict of the years of the venue to their merged invitations
+    '''
+    pattern = re.compile(re.escape(venue) + r"/(\d{4})/")
+    invitations = {}
+    for inv in openreview.tools.iterget_invitations(client, regex="{}/".format(venue), expired=True):
+        match = pattern.match(inv.id)
+        if match:
+            invitations.setdefault(match.group(1), []).append(inv.id)
+    years = sorted(int(year) for year in invitations)
+    log.info("Found {} years of {}: {}".format(len(years), venue, ", ".join(str(year) for year in years)))
+    return {int(year): merge_invitations(invs) for year, invs in invitations.items()}
+
+
+def get_invitations(client, venue, year):
+    '''
+    :return: the merged invitations of a venue year
+    '''
+    invitations_iterator = openreview.tools.iterget_invitations(client, regex="{}/{}/".format(venue, year), expired=True)
+    invitations = [inv.id for inv in invitations_iterator]
+    return merge_invitations(invitations)
+
+
+def get_notes(client, inv):
+    '''
+    :return: all notes of an invitation as json
+    '''
+    return [note.to_json() for note in openreview.tools.iterget_notes(client, invitation=inv)]
+
+
+def get_notes_since(client, inv, since, page_size=1000):
+    '''
+    Request the notes of an invitation which were modified after a given time, newest first.
+    :param since: tmdate in milliseconds or None to get all notes
+    :return: the modified notes as json
+    '''
+    if since is None:
+        return get_notes(client, inv)
+    notes = []
+    offset = 0
+    while True:
+        page = client.get_notes(invitation=inv, sort="tmdate:desc", limit=page_size, offset=offset)
+        for note in page:
+            if (note.tmdate or 0) <= since:
+                return notes
+            notes.append(note.to_json())
+        if len(page) < page_size:
+            return notes
+        offset += page_size
+
+
+def is_submission_invitation(inv):
+    # this is a bit of a hack but there is no general submission invitation but all submission invitations
+    # contain at least (S|s)ubmission somewhere
+    # check https://openreview-py.readthedocs.io/en/latest/get_submission_invitations.html to verify
+    return "submission" in inv.lower()
+
+
+def iterget_references(client, inv, original=False, mintcdate=None, page_size=1000):
+    '''
+    Request all references of an invitation page by page.
+    :param original: if True, the references of the original notes are included
+    :param mintcdate: only references created at or after this time
+    :return: list of references
+    '''
+    references = []
+    offset = 0
+    while True:
+        page = client.get_references(invitation=inv, original=original, mintcdate=mintcdate, limit=page_size,
+                                     offset=offset)
+        references.extend(page)
+        if len(page) < page_size:
+            return references
+        offset += page_size
+
+
+def index_references(reference_lists):
+    '''
+    Group references by their referent in a single pass
+    :param reference_lists: iterable of reference lists
+    :return: dict referent -> list of references in the order of the API
+    '''
+    index = {}
+    for references in reference_lists:
+        for r in references:
+            index.setdefault(r.referent, []).append(r)
+    return index
+
+
+def submission_references(client, n, index, log):
+    '''
+    Look up the references of a submission note (and its original note) in the reference index.
+    If the index has no references for the note, they are requested for this note alone.
+    :return: the references of a submission note. The first one is the original.
+    '''
+    refs = list(index.get(n["id"], []))
+    if n.get("original") and n["original"] != n["id"] and n["original"] in index:
+        seen = set(r.id for r in refs)
+        refs.extend(r for r in index[n["original"]] if r.id not in seen)
+        if len(refs) > len(index.get(n["id"], [])) > 0:
+            # both the note and its original have references, restore the order of the API (newest first)
+            refs.sort(key=lambda r: r.tcdate or 0, reverse=True)
+    if not refs:
+        refs = get_submission_references(client, n, log)
+    return refs
+
+
+def submission_revisions(client, n, index, venue_year, log, state=None):
+    '''
+    Get the revisions of a submission note from the reference index (or from the CrawlState if it is already processed)
+    :return: (revisions as json, id of the original reference if it has a pdf else None)
+    '''
+    processed = state.submission(n["id"]) if state is not None else None
+    if processed is not None:
+        return processed
+    refs = submission_references(client, n, index, log)
+    revisions = [r.to_json() for r in refs[1:]]
+    original_id = None
+    if len(refs) > 0 and "pdf" in refs[0].to_json()['content'].keys():
+        original_id = refs[0].id
+    if state is not None and refs:
+        state.finish_submission(venue_year, n["id"], revisions, original_id)
+    return revisions, original_id
+
+
+def get_submission_references(client, n, log):
+    '''
+    :return: the references of a submission note. The first one is the original.
+    '''
+    try:
+        return client.get_references(n["id"], original=True)
+    except openreview.OpenReviewException as e:
+        # the API refused the request (e.g. not found), throttling and server errors are retried by the
+        # rate limiter and raised if they persist
+        log.error("Request Error for ID: "+str(n["id"])+" "+str(e))
+        return []
+
+
+def get_invitation_references(client, inv, mintcdate=None):
+    '''
+    :param mintcdate: only references created at or after this time
+    :return: all references of the notes of a (non submission) invitation as json
+    '''
+    return [r.to_json() for r in iterget_references(client, inv, mintcdate=mintcdate)]
+
+
+def process_submission(n, revisions, original_id, venue_id, config, scheduler, client, db, log, state=None):
+    '''
+    Attach the revisions to a submission note and schedule its PDF downloads
+    :param n: the submission note as json
+    :param revisions: the revisions of the submission as json
+    :param original_id: the id of the original reference if it has a pdf, else None
+    '''
+    n["revisions"] = revisions
+    n["notes"] = []
+    if original_id is not None and not config["skip_pdf_download"]:
+        download_manager(n, original_id, venue_id, revisions, config, scheduler, client, db, log, state)
+
+
+def group_by(items, key):
+    '''
+    Group dictionaries by one of their values in a single pass
+    :param items: list of dictionaries
+    :param key: the key to group by
+    :return: dict value -> list of items in their original order
+    '''
+    groups = {}
+    for item in items:
+        groups.setdefault(item[key], []).append(item)
+    return groups
+
+
+def attach_revisions(notes, revisions):
+    '''
+    Attach the revisions of an invitation to their notes
+    '''
+    revisions_by_referent = group_by(revisions, "referent")
+    for note in notes:
+        note["revisions"] = list(revisions_by_referent.get(note["id"], []))
 
-    return results, threads
 
+def attach_notes(submissions, other_notes, venue, year, log):
+    '''
+    Attach the comments, reviews, decisions, ... to the submission of their forum
+    '''
+    if not submissions:
+        log.warning('No submissions found for '+ venue+' in '+str(year))
+        return
+    forum_idx_map = {n["forum"]: i for i, n in enumerate(submissions)}
+    for forum, notes in group_by(other_notes, "forum").items():
+        if forum in forum_idx_map:
+            submissions[forum_idx_map[forum]]["notes"].extend(notes)
+        else:
+            for note in notes:
+                log.debug("No submission found for note "+note["id"]+" in forum "+note["forum"])
+
+
+def label_submissions(submissions, venue, year, config, log):
+    '''
+    Tag the submissions for acceptance as soon as their notes are attached, if acceptance_labeling is configured.
+    The tagged submissions go to the writers without another pass over all results.
+    '''
+    if config['acceptance_labeling']:
+        for submission in submissions:
+            label_submission(submission, venue, year, log)
+
+
+def download_manager(n, original_id, venue_id, references, config, scheduler, client, db, log, state=None):
+    '''
+    This method schedules the PDF downloads of a submission and all its revisions.
+    PDFs which are already downloaded according to the CrawlState are skipped.
+    :param n: the submission note
+    :param original_id: the id of the original reference of the submission
+    :param venue_id: the id of the venue in the database
+    :param references: the revisions of the submission
+    :param scheduler: the DownloadScheduler which executes the downloads
+    :return: Nothing
+    '''
+    # the jobs get the store or cache instead of the config, so no credentials end up in their arguments
+    if uses_blob_store(config):
+        store = get_blob_store(os.path.join(config["outdir"], 'blobs'))
+        outputs = (config["output_json"], config["output_SQL"])
+        scheduler.submit(client.baseurl, download_blob, original_id, n, n["id"], venue_id, True, store, outputs,
+                         client, db, log, label=original_id)
+        for r in references:
+            scheduler.submit(client.baseurl, download_blob, r['id'], r, n["id"], venue_id, False, store, outputs,
+                             client, db, log, label=r['id'])
+        return
 
-def download_manager(n,original,venue_id,references,threads):
+    cache = None
     if config["output_json"]:
+        cache = get_pdf_cache(os.path.join(config["outdir"], 'pdf/'), config.get("pdf_cache_verify_hash", False),
+                              config.get("pdf_cache_revalidate", False))
         pdf_name = n["id"] + '_' + str(0) + '.pdf'
         n['content']['pdf'] = '/pdf/' + pdf_name
-        if config["threaded_download"]:
-            x = threading.Thread(target=download_revision_fs, args=(original.id, pdf_name, client))
-            threads.append(x)
-            x.start()
-        else:download_revision_fs(original.id, pdf_name, client)
+        schedule_download(scheduler, client, state, 'fs/' + pdf_name + '/' + original_id,
+                          download_revision_fs, original_id, pdf_name, client, cache, log)
     if config["output_SQL"]:
-        if config["threaded_download"]:
-            x = threading.Thread(target=download_submission_db, args=(original.id, client, db, venue_id, n["id"]))
-            threads.append(x)
-            x.start()
-        else:download_submission_db(original.id, client, db, venue_id, n["id"])
+        schedule_download(scheduler, client, state, 'db/' + n["id"] + '/' + original_id,
+                          download_submission_db, original_id, client, db, venue_id, n["id"], log)
 
     for index, r in enumerate(references):
         if config["output_json"]:
             pdf_name = n["id"] + '_' + str(index + 1) + '.pdf'
             r['content']['pdf'] = '/pdf/' + pdf_name
-            if config["threaded_download"]:
-                x = threading.Thread(target=download_revision_fs, args=(r['id'], pdf_name, client))
-                threads.append(x)
-                x.start()
-            else:download_revision_fs(r['id'], pdf_name, client)
+            schedule_download(scheduler, client, state, 'fs/' + pdf_name + '/' + r['id'],
+                              download_revision_fs, r['id'], pdf_name, client, cache, log)
         if config["output_SQL"]:
-            if config["threaded_download"]:
-                x = threading.Thread(target=download_revision_db, args=(r['id'], client, db, n["id"]))
-                threads.append(x)
-                x.start()
-            else:download_revision_db(r['id'], client, db, n["id"])
+            schedule_download(scheduler, client, state, 'db/' + n["id"] + '/' + r['id'],
+                              download_revision_db, r['id'], client, db, n["id"], log)
+
+
+def schedule_download(scheduler, client, state, pdf_id, download, *args):
+    '''
+    Submit a download to the scheduler unless the CrawlState knows it is already done
+    :param pdf_id: the key of the download in the CrawlState
+    :param download: one of the download_* functions
+    '''
+    if state is not None and state.pdf_done(pdf_id):
+        return
+    scheduler.submit(client.baseurl, tracked_download, state, pdf_id, download, *args, label=pdf_id)
+
+
+def tracked_download(state, pdf_id, download, *args):
+    if state is None:
+        return download(*args)
+    if pdf_id.startswith('db/'):
+        # a PDF for the database is done once the SQLDatabase committed it, not once it is queued
+        return download(*args, done=lambda: state.finish_pdf(pdf_id))
+    size = download(*args)
+    state.finish_pdf(pdf_id)
+    return size
 
 
 def merge_invitations(invitations):
@@ -158,62 +533,121 @@ def merge_invitations(invitations):
     return new_invitations
 
 
-def download_revision_fs(ref_id, pdf_name, client):
+def download_revision_fs(ref_id, pdf_name, client, cache, log):
     '''
     This method downloads a pdf file from a openreview note and stores it in the oupath/pdf/ folder.
     If the folder does not exist, it will be created.
+    PDFs which are already in the folder from an earlier run are taken from the PDFCache.
+    Connection errors are raised so the DownloadScheduler can retry the download.
     :param ref_id: The target note id
     :param pdf_name: The target filename
     :param client: The openreview client
-    :return: Nothing
+    :param cache: the PDFCache of the outdir/pdf/ folder
+    :return: The size of the pdf in bytes or None if there is no pdf or it came from the cache
     '''
-    out_path = os.path.join(config["outdir"], 'pdf/')
-    if not os.path.exists(out_path): os.makedirs(out_path)
     if not ref_id: return
     try:
-        file = client.get_pdf(ref_id, is_reference=True)
-    except:
+        size = cache.download(client, ref_id, pdf_name)
+    except openreview.OpenReviewException:
         log.info(ref_id + ' has no pdf ')
         return
-    with open(os.path.join(out_path, pdf_name), "wb") as file1:
-        file1.write(file)
-    log.info(pdf_name + ' downloaded')
+    if size is None:
+        log.debug(pdf_name + ' from cache')
+    else:
+        log.info(pdf_name + ' downloaded')
+    return size
+
 
+def uses_blob_store(config):
+    return config.get("pdf_store", "files") == "blobs"
 
-def download_revision_db(ref_id, client, db ,submission_id):
+
+def download_blob(ref_id, note, submission_id, venue_id, is_submission, store, outputs, client, db, log):
     '''
-    This method downloads a pdf file from a openreview note and stores it in the oupath/pdf/ folder.
-    If the folder does not exist, it will be created.
+    This method streams a pdf file from a openreview note into the BlobStore in the outdir/blobs/ folder.
+    Each PDF is downloaded once for both outputs. The JSON note gets the fields pdf_sha256 and pdf_size,
+    the database row the columns of the same name.
+    Connection errors are raised so the DownloadScheduler can retry the download.
+    :param ref_id: The target note id
+    :param note: The JSON of the submission (for the original) or of the revision
+    :param submission_id: The id of the submission
+    :param venue_id: The id of the venue of the submission
+    :param is_submission: True for the original of a submission, False for a revision
+    :param store: the BlobStore of the outdir/blobs/ folder
+    :param outputs: (output_json, output_SQL) of the config
+    :return: The size of the pdf in bytes, None if there is no pdf or it was already stored
+    '''
+    if not ref_id: return
+    output_json, output_sql = outputs
+    downloaded = None
+    stored = store.cached(ref_id)
+    if stored is None:
+        try:
+            sha256, size = store.put(iter_pdf(client, ref_id))
+        except openreview.OpenReviewException:
+            log.info(ref_id + ' has no pdf ')
+            return
+        store.add_ref(ref_id, sha256, size)
+        downloaded = size
+        log.info(ref_id + ' downloaded')
+    else:
+        sha256, size = stored
+    if output_json:
+        note["pdf_sha256"] = sha256
+        note["pdf_size"] = size
+    if output_sql:
+        if is_submission:
+            db.insert_submission(venue_id, submission_id, pdf_sha256=sha256, pdf_size=size)
+        else:
+            db.insert_revision(ref_id, submission_id, pdf_sha256=sha256, pdf_size=size)
+    return downloaded
+
+
+def download_revision_db(ref_id, client, db, submission_id, log, done=None):
+    '''
+    This method downloads a pdf file from a openreview note and inserts it as revision into the database.
+    Connection errors are raised so the DownloadScheduler can retry the download.
     :param ref_id: The target note id
-    :param pdf_name: The target filename
     :param client: The openreview client
-    :return: Nothing
+    :param db: The SQLDatabase
+    :param submission_id: The id of the submission the revision belongs to
+    :param done: called once the pdf is committed to the database or the note has no pdf
+    :return: The size of the pdf in bytes or None if there is no pdf
     '''
     if not ref_id: return
     try:
         file = client.get_pdf(ref_id, is_reference=True)
-    except:
+    except openreview.OpenReviewException:
         log.info(ref_id + ' has no pdf ')
+        if done is not None:
+            done()
         return
-    db.insert_revision(ref_id, submission_id, pdf=file)
+    db.insert_revision(ref_id, submission_id, pdf=file, done=done)
+    return len(file)
 
 
-def download_submission_db(ref_id, client, db, venue_id,submission_id):
+def download_submission_db(ref_id, client, db, venue_id, submission_id, log, done=None):
     '''
-    This method downloads a pdf file from a openreview note and stores it in the oupath/pdf/ folder.
-    If the folder does not exist, it will be created.
+    This method downloads a pdf file from a openreview note and inserts it as submission into the database.
+    Connection errors are raised so the DownloadScheduler can retry the download.
     :param ref_id: The target note id
-    :param pdf_name: The target filename
     :param client: The openreview client
-    :return: Nothing
+    :param db: The SQLDatabase
+    :param venue_id: The id of the venue of the submission
+    :param submission_id: The id of the submission
+    :param done: called once the pdf is committed to the database or the note has no pdf
+    :return: The size of the pdf in bytes or None if there is no pdf
     '''
     if not ref_id: return
     try:
         file = client.get_pdf(ref_id, is_reference=True)
-    except:
+    except openreview.OpenReviewException:
         log.info(ref_id + ' has no pdf ')
+        if done is not None:
+            done()
         return
-    db.insert_submission( venue_id,submission_id,pdf=file)
+    db.insert_submission(venue_id, submission_id, pdf=file, done=done)
+    return len(file)
 
 
 def get_all_available_venues():
@@ -257,36 +691,77 @@ if __name__ == '__main__':
         password = config["password"]
 
     client = openreview.Client(
-        baseurl='https://openreview.net',
+        baseurl=args.baseurl,
         username=username,
         password=password)
     log.info('Login as '+username+' was successful')
+    limiter = TokenBucket(rate=config.get("request_rate", 10.0), max_rate=config.get("request_rate_max", 50.0))
+    ledger = RetryLedger(config.get("retry_ledger"))
+    policy = {call: tuple(p) for call, p in config.get("request_retries", {}).items()}
+    install_rate_limit(client, limiter, ledger, policy)
+    # every download worker (and every thread of the async crawl) gets its own client with the same token
+    clients = ClientPool(client, limiter, ledger, policy)
 
     db = None
     if config["output_SQL"]:
         # db = SQLDatabase(dbtype='postgresql', dbname='dasp2')
-        db = SQLDatabase(dbtype='sqlite', dbname='myCrawl')
+        db = SQLDatabase(dbtype='sqlite', dbname='myCrawl', bulk=config.get("sql_bulk_insert", False),
+                         batch_size=config.get("sql_batch_size", 1000),
+                         commit_interval=config.get("sql_commit_interval", 1.0),
+                         queue_bytes=config.get("sql_queue_mb", 256) << 20)
         db.create_db_tables()
         db.start()
         #x = threading.Thread(target=db.run())
 
-    results,threads = crawl(client, config, log,db)
-    if config['acceptance_labeling']:
-        results = labeling(results,log)
+    scheduler = DownloadScheduler(workers=config.get("download_workers", 8) if config["threaded_download"] else 0,
+                                  queue_size=config.get("download_queue_size", 64),
+                                  per_host_limit=config.get("download_per_host", 4),
+                                  retries=config.get("download_retries", 3),
+                                  backoff=config.get("download_backoff", 1.0),
+                                  log=log)
 
-    if config["output_SQL"]:
-        while any(thread.is_alive() for thread in threads) and not db.q.empty():
-            log.info('PDF Download Threads still active')
-            time.sleep(1)
+    state = None
+    if config.get("state_file"):
+        state = CrawlState(config["state_file"])
+
+    writer = None
+    if config["output_json"] and config.get("json_streaming", False):
+        writer = JSONLinesWriter(os.path.join(config["outdir"], os.path.splitext(config["filename"])[0]))
+
+    if config.get("async_crawl", False):
+        from async_crawler import crawl_async
+        results = crawl_async(clients, config, log, db, scheduler, writer, state)
+    else:
+        results = crawl(clients, config, log, db, scheduler, writer, state)
 
-        db.insert_dict(results)
+    log.info('Waiting for the PDF downloads to finish')
+    scheduler.close()
+    scheduler.log_throughput()
+    limiter.log_stats(log)
+    ledger.log_stats(log)
+    clients.log_stats(log)
+    clients.close()
+    if not config["skip_pdf_download"]:
+        if uses_blob_store(config):
+            get_blob_store(os.path.join(config["outdir"], 'blobs')).log_stats(log)
+        elif config["output_json"]:
+            get_pdf_cache(os.path.join(config["outdir"], 'pdf/')).log_stats(log)
+
+    if config["output_SQL"]:
+        # the writer yields the written venue years one by one
+        db.insert_dict(results if writer is None else writer)
+        log.info('Waiting for the SQL insertion, Queue Size: '+ str(db.q.qsize()))
         db.close()
-        while db.is_alive() :
-            log.info('SQL Insertion still active, Queue Size: '+ str(db.q.qsize()))
-            time.sleep(1)
+        db.join()
+        db.log_queue_stats()
 
-    if config["output_json"]:
+    if config["output_json"] and writer is None:
         if not os.path.exists(config["outdir"]):
             os.makedirs(config["outdir"])
         with open(os.path.join(config["outdir"], config["filename"]), 'w') as file_handle:
             json.dump(results, file_handle, indent=config["json_indent"])
+
+    if state is not None:
+        # everything is stored, only the downloaded PDFs are kept for the next run
+        state.clear()
+        state.close()
@@ -1,5 +1,7 @@
+import collections
+import json
 import threading
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.inspection import inspect
 from . import database_model as model
@@ -7,7 +9,9 @@ import progressbar
 from sqlalchemy.orm import scoped_session
 import queue
 import logging
+import time
 from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 # Global Variables
 SQLITE                  = 'sqlite'
 POSTGRES                = 'postgresql'
@@ -19,6 +23,259 @@ def object_as_dict(obj, skip_keys=[]):
             if c.key not in skip_keys}
 
 
+def submission_row(s, venue_id):
+    '''
+    :return: the columns of the submission table for a submission of the crawler output
+    '''
+    row = {'id': s["id"], 'venue': venue_id,
+            'original': s["original"], 'cdate': s["cdate"],
+            'tcdate': s["tcdate"],
+            'tmdate': s["tmdate"],
+            'ddate': s["ddate"], 'number': s["number"],
+            'title': s['content']["title"] if "title" in s['content'].keys()  else "",
+            'abstract': s['content']["abstract"] if "abstract" in s['content'].keys()  else "",
+            'replyto': s["replyto"] if "replyto" in s['content'].keys()  else "",
+            'acceptance_tag': s['acceptance_tag'] if "acceptance_tag" in s.keys() else "",
+            'pdf_ref': s['content']["pdf"] if "pdf" in s['content'].keys()  else "",
+            'forum': s["forum"],
+            'referent': s["referent"], 'invitation': s["invitation"]
+            , 'replyCount': s['details']["replyCount"]}
+    return __pdf_blob(s, row)
+
+
+def revision_row(r, submission_id):
+    '''
+    :return: the columns of the revisions table for a revision of a submission
+    '''
+    row = {'id': r["id"],
+            'submission': submission_id,
+            'original': r["original"], 'cdate': r["cdate"],
+            'tcdate': r["tcdate"],
+            'tmdate': r["tmdate"],
+            'ddate': r["ddate"], 'number': r["number"],
+            'title': r['content']["title"] if "title" in r['content'].keys() else "",
+            'abstract': r['content']["abstract"]if "abstract" in r['content'].keys() else "",
+            'replyto': r["replyto"] if "replyto" in r['content'].keys() else "",
+            'pdf_ref': r['content']["pdf"] if "pdf" in r['content'].keys() else "",
+            'forum': r["forum"],
+            'referent': r["referent"], 'invitation': r["invitation"]}
+    return __pdf_blob(r, row)
+
+
+def __pdf_blob(note, row):
+    # hash and size of the PDF in the BlobStore, if the crawl stored them in the note
+    for key in ('pdf_sha256', 'pdf_size'):
+        if key in note:
+            row[key] = note[key]
+    return row
+
+
+def note_row(n, parent_id):
+    '''
+    :param parent_id: the id of the submission of a note or of the note of a note revision
+    :return: the columns of the notes or note_revision table
+    '''
+    return {'id': n["id"], 'submission': parent_id,
+            'original': n["original"], 'cdate': n["cdate"],
+            'tcdate': n["tcdate"],
+            'tmdate': n["tmdate"],
+            'ddate': n["ddate"], 'number': n["number"],
+            'title': n['content']["title"] if "title" in n['content'].keys() else "",
+            'decision': n['content']["decision"] if "decision" in n['content'].keys() else "",
+            'forum': n["forum"],
+            'referent': n['referent'], 'invitation': n["invitation"],
+            'replyto': n["replyto"], 'replyCount': n['details']["replyCount"]}
+
+
+def submission_rows(s, venue_id):
+    '''
+    All rows of a submission of the crawler output: the submission, its revisions, notes and note revisions
+    with their content and authors
+    :return: generator of (model class, row dict)
+    '''
+    yield model.Submission, submission_row(s, venue_id)
+    for row in content_rows(s["id"], s["content"]):
+        yield model.Content, row
+    yield from __author_rows(s)
+
+    for r in s['revisions']:
+        yield model.Revision, revision_row(r, s["id"])
+        for row in content_rows(r["id"], r["content"]):
+            yield model.Content, row
+        yield from __author_rows(r)
+
+    for n in s['notes']:
+        yield model.Note, note_row(n, s["id"])
+        for row in content_rows(n["id"], n["content"]):
+            yield model.Content, row
+
+        for nr in n['revisions']:
+            yield model.NoteRevision, note_row(nr, n["id"])
+            for row in content_rows(nr["id"], nr["content"]):
+                yield model.Content, row
+
+
+def __author_rows(note):
+    authors, authorships = author_rows(note["id"], note["content"])
+    for row in authors:
+        yield model.Author, row
+    for row in authorships:
+        yield model.Authorship, row
+
+
+def author_rows(note_id, content):
+    '''
+    :return: (rows of the author table, rows of the authorship table) for the authors and authorids of a content.
+             All authors are kept, an author without authorid has no author row.
+    '''
+    names = content.get("authors") or []
+    ids = content.get("authorids") or []
+    authors = []
+    authorships = []
+    for i in range(max(len(names), len(ids))):
+        name = names[i] if i < len(names) else None
+        author_id = ids[i] if i < len(ids) and ids[i] else None
+        authorships.append({'note': note_id, 'position': i, 'author': author_id, 'name': name})
+        if author_id is not None:
+            authors.append({'id': author_id, 'name': name} if name is not None else {'id': author_id})
+    return authors, authorships
+
+
+def content_rows(note_id, content):
+    '''
+    :return: the rows of the content table for a content, lists are stored as one row per item
+    '''
+    rows = []
+    for key, value in content.items():
+        if isinstance(value, list):
+            rows.extend({'note': note_id, 'key': key, 'position': i, 'value': content_value(v)}
+                        for i, v in enumerate(value))
+        else:
+            rows.append({'note': note_id, 'key': key, 'position': -1, 'value': content_value(value)})
+    return rows
+
+
+def content_value(value):
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def add_missing_columns(engine, log=None):
+    '''
+    Add the columns of the model which are missing in existing tables, e.g. pdf_sha256 and pdf_size in a database
+    of an older version of the crawler. create_all only creates missing tables, not missing columns.
+    Only nullable columns without primary key can be added, the existing rows get NULL.
+    :return: list of the added columns as "table.column"
+    '''
+    log = log or logging.getLogger("crawler")
+    inspector = inspect(engine)
+    added = []
+    with engine.begin() as connection:
+        for table in model.Base.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = set(c["name"] for c in inspector.get_columns(table.name))
+            for column in table.columns:
+                if column.name in existing or column.primary_key or not column.nullable:
+                    continue
+                connection.execute(text('ALTER TABLE "{}" ADD COLUMN "{}" {}'.format(
+                    table.name, column.name, column.type.compile(engine.dialect))))
+                added.append("{}.{}".format(table.name, column.name))
+    if added:
+        log.info("Added columns {}".format(", ".join(added)))
+    return added
+
+
+class ByteBoundedQueue:
+    '''
+    FIFO queue for a single consumer which is bounded by the total size of the items instead of their number.
+    An item counts until it is marked with task_done, so items which the consumer holds are included.
+    put blocks while the queue holds more than max_bytes. An item which is larger than max_bytes on its own
+    is accepted once the queue is empty, so it can not block forever.
+    task_done and join work like in queue.Queue. The queue keeps its peak size in bytes and the time
+    items waited in it (writer lag).
+    '''
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.items = collections.deque()
+        # sizes of the items which are taken but not done yet, in order
+        self.taken = collections.deque()
+        self.bytes = 0
+        self.peak_bytes = 0
+        self.unfinished = 0
+        self.gets = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.not_full = threading.Condition(self.lock)
+        self.all_done = threading.Condition(self.lock)
+
+    def put(self, item, size=0):
+        with self.not_full:
+            while self.__blocks(size):
+                self.not_full.wait()
+            self.items.append((item, size, time.time()))
+            self.bytes += size
+            self.peak_bytes = max(self.peak_bytes, self.bytes)
+            self.unfinished += 1
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        '''
+        :raises queue.Empty: if no item arrived within timeout seconds
+        '''
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.items, timeout):
+                raise queue.Empty
+            item, size, put_time = self.items.popleft()
+            self.taken.append(size)
+            lag = time.time() - put_time
+            self.gets += 1
+            self.total_lag += lag
+            self.max_lag = max(self.max_lag, lag)
+            return item
+
+    def task_done(self, n=1):
+        '''
+        Mark n items which were taken with get as processed
+        '''
+        with self.all_done:
+            for _ in range(n):
+                self.bytes -= self.taken.popleft()
+            self.unfinished -= n
+            self.not_full.notify_all()
+            if self.unfinished <= 0:
+                self.all_done.notify_all()
+
+    def join(self):
+        '''
+        Block until all items are taken and processed
+        '''
+        with self.all_done:
+            self.all_done.wait_for(lambda: self.unfinished <= 0)
+
+    def qsize(self):
+        with self.lock:
+            return len(self.items)
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self, size=0):
+        '''
+        :return: True if put would block for an item of size bytes
+        '''
+        with self.lock:
+            return self.__blocks(size)
+
+    def __blocks(self, size):
+        # called with the lock held
+        return self.bytes > 0 and self.bytes + size > self.max_bytes
+
+
 class SQLDatabase(threading.Thread):
     # http://docs.sqlalchemy.org/en/latest/core/engines.html
     DB_ENGINE = {
@@ -31,8 +288,36 @@ class SQLDatabase(threading.Thread):
     db_engine = None
     Session = None
 
-    def __init__(self, dbtype=None, username='', password='', dbname='', engine_url=''):
+    # Dialect specific INSERT ... ON CONFLICT statements for the bulk writer
+    UPSERT = {
+        SQLITE: sqlite_insert,
+        POSTGRES: insert,
+    }
+
+    # estimated size of a queued object without PDF in bytes
+    OBJECT_SIZE = 1024
+
+    # rows which belong to a note of these tables, they are replaced as a whole when the note is inserted again
+    NOTE_ROWS = {
+        model.Submission: (model.Content, model.Authorship),
+        model.Revision: (model.Content, model.Authorship),
+        model.Note: (model.Content,),
+        model.NoteRevision: (model.Content,),
+    }
+
+    def __init__(self, dbtype=None, username='', password='', dbname='', engine_url='', bulk=False, batch_size=1000,
+                 commit_interval=1.0, queue_bytes=256 << 20):
+        '''
+        :param bulk: if True, the queue is drained in batches which are written with bulk upserts
+        :param batch_size: maximal number of queued objects per batch
+        :param commit_interval: maximal number of seconds a batch waits for more objects before it is committed
+        :param queue_bytes: maximal size of the queued objects (PDFs and OBJECT_SIZE per object), command blocks
+                            while the queue is full
+        '''
         threading.Thread.__init__(self)
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.commit_interval = commit_interval
         dbtype = dbtype.lower()
         if dbtype in self.DB_ENGINE.keys() or engine_url:
             self.log = logging.getLogger("crawler")
@@ -42,35 +327,182 @@ class SQLDatabase(threading.Thread):
             self.db_engine = create_engine(engine_url)
             session_factory= sessionmaker(bind=self.db_engine)
             self.Session = scoped_session(session_factory)
-            self.q = queue.Queue()
+            self.q = ByteBoundedQueue(queue_bytes)
         else:
             print("DBType is not found in DB_ENGINE")
 
     def run(self):
+        if self.bulk and self.db_engine.dialect.name in self.UPSERT:
+            self.run_bulk()
+            return
         while True:
             session = self.Session()
-            cmd,data= self.q.get()
-            if cmd == "quit":
-                break
-            elif cmd == "add" or cmd == "merge":
-                session.merge(data)
-                session.commit()
-                self.log.debug('Value inserted into db')
-            else:
-                print("Database Command not found: ",cmd)
+            cmd,data,done = self.q.get()
+            try:
+                if cmd == "quit":
+                    break
+                elif cmd == "add" or cmd == "merge":
+                    session.merge(data)
+                    session.commit()
+                    self.log.debug('Value inserted into db')
+                    if done is not None:
+                        done()
+                elif cmd == "replace":
+                    entity, note, rows = data
+                    session.query(entity).filter(entity.note == note).delete(synchronize_session=False)
+                    session.add_all([entity(**row) for row in rows])
+                    session.commit()
+                else:
+                    print("Database Command not found: ",cmd)
+            except Exception as e:
+                # the thread keeps running, otherwise the producers would wait for the queue forever
+                session.rollback()
+                self.log.error('Value could not be inserted into db: {}'.format(e))
+            finally:
+                self.q.task_done()
+
+
+    def run_bulk(self):
+        '''
+        Writer loop of the bulk mode: collect up to batch_size objects or wait at most commit_interval seconds,
+        then write the batch with one upsert per table in a single transaction.
+        '''
+        rows = 0
+        started = time.time()
+        running = True
+        while running:
+            batch = []
+            callbacks = []
+            replaced = []
+            cmd, data, done = self.q.get()
+            taken = 1
+            deadline = time.time() + self.commit_interval
+            while True:
+                if cmd == "quit":
+                    running = False
+                    break
+                elif cmd == "add" or cmd == "merge":
+                    batch.append(data)
+                    callbacks.append(done)
+                elif cmd == "replace":
+                    replaced.append(data)
+                else:
+                    print("Database Command not found: ", cmd)
+                # write right away if the next object would wait for the full queue
+                if len(batch) + len(replaced) >= self.batch_size or self.q.full(self.OBJECT_SIZE):
+                    break
+                try:
+                    cmd, data, done = self.q.get(timeout=max(deadline - time.time(), 0))
+                    taken += 1
+                except queue.Empty:
+                    break
+            if batch or replaced:
+                try:
+                    rows += self.upsert(batch, replaced)
+                    written = callbacks
+                except Exception as e:
+                    # the thread keeps running, otherwise the producers would wait for the queue forever.
+                    # The batch is written again object by object, so only the failing objects are lost
+                    self.log.warning('Batch of {} values could not be inserted into db: {}'.format(
+                        len(batch) + len(replaced), e))
+                    written = []
+                    for objects, replace, done in [([obj], [], done) for obj, done in zip(batch, callbacks)] + \
+                                                  [([], [r], None) for r in replaced]:
+                        try:
+                            rows += self.upsert(objects, replace)
+                            written.append(done)
+                        except Exception as e:
+                            self.log.error('Value could not be inserted into db: {}'.format(e))
+                for done in written:
+                    if done is not None:
+                        done()
+                self.log.debug('{} rows inserted into db ({:.0f} rows/s, queue {:.1f} MB)'.format(
+                    rows, rows / max(time.time() - started, 1e-9), self.q.bytes / 1e6))
+            self.q.task_done(taken)
+        self.log.info('SQL Insertion finished: {} rows, {:.0f} rows/s'.format(
+            rows, rows / max(time.time() - started, 1e-9)))
+
+    def upsert(self, objects, replaced=()):
+        '''
+        Insert or update ORM objects with INSERT ... ON CONFLICT DO UPDATE.
+        Like session.merge, only the attributes which are set on an object are written, so e.g. a PDF
+        inserted before is not overwritten by the metadata of the same submission.
+        Objects with the same primary key are combined into one row.
+        :param objects: list of ORM objects
+        :param replaced: list of (model class, note id, rows) from replace, the rows of the note in the table
+                         are deleted and the given rows inserted (the last rows of a note in the list win)
+        :return: the number of written rows
+        '''
+        upsert = self.UPSERT[self.db_engine.dialect.name]
+        rows = {}
+        for obj in objects:
+            state = inspect(obj)
+            values = {c.key: state.dict[c.key] for c in state.mapper.column_attrs if c.key in state.dict}
+            key = (state.mapper.local_table, tuple(values.get(c.key) for c in state.mapper.primary_key))
+            rows.setdefault(key, {}).update(values)
 
+        # executemany needs the same columns for all rows of a statement
+        groups = {}
+        for (table, _), values in rows.items():
+            groups.setdefault((table, tuple(sorted(values))), []).append(values)
+        order = {table: i for i, table in enumerate(model.Base.metadata.sorted_tables)}
+        written = len(rows)
+        with self.db_engine.begin() as connection:
+            for (table, columns), values in sorted(groups.items(), key=lambda g: order.get(g[0][0], 0)):
+                stmt = upsert(table)
+                primary_key = [c.name for c in table.primary_key]
+                update = {c: stmt.excluded[c] for c in columns if c not in primary_key}
+                if update:
+                    stmt = stmt.on_conflict_do_update(index_elements=primary_key, set_=update)
+                else:
+                    stmt = stmt.on_conflict_do_nothing(index_elements=primary_key)
+                connection.execute(stmt, values)
+            replacements = {}
+            for entity, note, note_rows in replaced:
+                replacements.setdefault(entity, {})[note] = note_rows
+            for entity, notes in replacements.items():
+                table = entity.__table__
+                connection.execute(table.delete().where(table.c.note.in_(list(notes))))
+                inserted = [row for note_rows in notes.values() for row in note_rows]
+                if inserted:
+                    connection.execute(table.insert(), inserted)
+                written += len(inserted)
+        return written
 
     def close(self):
-        self.q.put(("quit","quit"))
+        self.q.put(("quit","quit",None))
         self.log.info('Last Value has been added to the database queue')
 
-    def command(self, cmd,data):
-        # Kommando in Warteschlange einreihen
-        self.q.put((cmd,data))
+    def command(self, cmd,data, done=None):
+        # Kommando in Warteschlange einreihen, blockiert solange die Warteschlange voll ist.
+        # done wird vom Schreib-Thread aufgerufen, sobald das Objekt committet ist
+        pdf = getattr(data, "pdf_binary", None)
+        self.q.put((cmd,data,done), self.OBJECT_SIZE + (len(pdf) if pdf is not None else 0))
+
+    def replace(self, entity, note, rows):
+        '''
+        Replace the rows of a note in the content or authorship table, so rows which the note does not have
+        anymore are deleted
+        :param entity: model.Content or model.Authorship
+        :param rows: all rows of the note as dicts, can be empty
+        '''
+        self.q.put(("replace", (entity, note, rows), None), self.OBJECT_SIZE * max(len(rows), 1))
+
+    def flush(self):
+        '''
+        Block until all queued objects are written
+        '''
+        self.q.join()
+
+    def log_queue_stats(self):
+        self.log.info('SQL queue: peak {:.1f} MB, writer lag {:.2f}s on average, {:.2f}s at most'.format(
+            self.q.peak_bytes / 1e6, self.q.total_lag / max(self.q.gets, 1), self.q.max_lag))
 
     def create_db_tables(self):
         try:
             model.Base.metadata.create_all(self.db_engine)
+            # a database of an older version gets the new columns of its existing tables
+            add_missing_columns(self.db_engine, self.log)
             print("Tables created")
         except Exception as e:
             print("Error occurred during Table creation!" )
@@ -90,16 +522,29 @@ class SQLDatabase(threading.Thread):
         session = self.Session()
         return [object_as_dict(venue) for venue in session.query(model.Venue).all()]
 
-    def insert_submission(self, venue_id,submission_id,pdf=None):
-
-        sub_dict = {'id': submission_id, 'venue': venue_id,
-                    'pdf_binary': pdf }
-        self.command("add",model.Submission(**sub_dict))
+    def insert_submission(self, venue_id,submission_id,pdf=None, pdf_sha256=None, pdf_size=None, done=None):
+        '''
+        Insert the PDF of a submission, either as binary or as hash and size of the file in the BlobStore
+        :param done: called without arguments by the writer thread once the row is committed
+        '''
+        sub_dict = {'id': submission_id, 'venue': venue_id}
+        if pdf is not None:
+            sub_dict['pdf_binary'] = pdf
+        if pdf_sha256 is not None:
+            sub_dict.update({'pdf_sha256': pdf_sha256, 'pdf_size': pdf_size})
+        self.command("add",model.Submission(**sub_dict), done)
 
-    def insert_revision(self, revision_id,submission_id,pdf=None):
-        rev_dict = {'id': revision_id, 'submission': submission_id,
-                    'pdf_binary': pdf }
-        self.command("add",model.Revision(**rev_dict))
+    def insert_revision(self, revision_id,submission_id,pdf=None, pdf_sha256=None, pdf_size=None, done=None):
+        '''
+        Insert the PDF of a revision, either as binary or as hash and size of the file in the BlobStore
+        :param done: called without arguments by the writer thread once the row is committed
+        '''
+        rev_dict = {'id': revision_id, 'submission': submission_id}
+        if pdf is not None:
+            rev_dict['pdf_binary'] = pdf
+        if pdf_sha256 is not None:
+            rev_dict.update({'pdf_sha256': pdf_sha256, 'pdf_size': pdf_size})
+        self.command("add",model.Revision(**rev_dict), done)
 
     def insert_dict(self,dict):
         '''
@@ -111,80 +556,17 @@ class SQLDatabase(threading.Thread):
         for el in dict:
             self.command("merge", model.Venue(id=el["venue_id"],venue =el["venue"],year= el["year"]))
             for s in progressbar.progressbar(el["submissions"]):
-                sub_dict = {'id': s["id"], 'venue': el["venue_id"],
-                                    'original': s["original"], 'cdate': s["cdate"],
-                                    'tcdate': s["tcdate"],
-                                    'tmdate': s["tmdate"],
-                                    'ddate': s["ddate"], 'number': s["number"],
-                                    'title': s['content']["title"] if "title" in s['content'].keys()  else "",
-                                    'abstract': s['content']["abstract"] if "abstract" in s['content'].keys()  else "",
-                                    'replyto': s["replyto"] if "replyto" in s['content'].keys()  else "",
-                                    'acceptance_tag': s['acceptance_tag'] if "acceptance_tag" in s.keys() else "",
-                                    'pdf_ref': s['content']["pdf"] if "pdf" in s['content'].keys()  else "",
-                                    'forum': s["forum"],
-                                    'referent': s["referent"], 'invitation': s["invitation"]
-                                    , 'replyCount': s['details']["replyCount"],
-                                    'submission_content': str(s["content"])}
-                if "authorids" in s['content'].keys():
-                    for i,authorid in enumerate(s['content']["authorids"][:12]):
-                        sub_dict.update({'authorid'+str(i) : s['content']["authorids"][i]})
-                if "authors" in s['content'].keys():
-                    for i,authorid in enumerate(s['content']["authors"][:12]):
-                        sub_dict.update({'author' + str(i): s['content']["authors"][i]})
-                self.command("merge", model.Submission(**sub_dict))
-
-                for r in s['revisions']:
-                    rev_dict={'id': r["id"],
-                                  'submission': s["id"],
-                                    'original': r["original"], 'cdate': r["cdate"],
-                                    'tcdate': r["tcdate"],
-                                    'tmdate': r["tmdate"],
-                                    'ddate': r["ddate"], 'number': r["number"],
-                                    'title': r['content']["title"] if "title" in r['content'].keys() else "",
-                                    'abstract': r['content']["abstract"]if "abstract" in r['content'].keys() else "",
-                                    'replyto': r["replyto"] if "replyto" in r['content'].keys() else "",
-                                    'pdf_ref': r['content']["pdf"] if "pdf" in r['content'].keys() else "",
-                                    'forum': r["forum"],
-                                    'referent': r["referent"], 'invitation': r["invitation"],
-                                    'revision_content': str(r["content"])}
-                    if "authorids" in r['content'].keys():
-                        for i, authorid in enumerate(r['content']["authorids"][:12]):
-                            rev_dict.update({'authorid' + str(i): r['content']["authorids"][i]})
-                    if "authors" in r['content'].keys():
-                        for i, authorid in enumerate(r['content']["authors"][:12]):
-                            rev_dict.update({'author' + str(i): r['content']["authors"][i]})
-                    self.command("merge", model.Revision(**rev_dict))
-
-                for n in s['notes']:
-                    notes={'id': n["id"], 'submission': s["id"],
-                                        'original': n["original"], 'cdate': n["cdate"],
-                                        'tcdate': n["tcdate"],
-                                        'tmdate': n["tmdate"],
-                                        'ddate': n["ddate"], 'number': n["number"],
-                                        'title': n['content']["title"] if "title" in n['content'].keys() else "",
-                                        'decision': n['content']["decision"]if "decision" in n['content'].keys() else "",
-                                        'forum': n["forum"],
-                                        'referent': n['referent'], 'invitation': n["invitation"],
-                                        'replyto': n["replyto"], 'replyCount': n['details']["replyCount"],
-                                        'note_content': str(n["content"])
-                                           }
-                    self.command("merge", model.Note(**notes))
-
-                    for nr in n['revisions']:
-                        note_revisions={'id': nr["id"], 'submission': n["id"],
-                                      'original': nr["original"], 'cdate': nr["cdate"],
-                                      'tcdate': nr["tcdate"],
-                                      'tmdate': nr["tmdate"],
-                                      'ddate': nr["ddate"], 'number': nr["number"],
-                                      'title': nr['content']["title"] if "title" in nr['content'].keys() else "",
-                                      'decision': nr['content']["decision"] if "decision" in nr['content'].keys() else "",
-                                      'forum': nr["forum"],
-                                      'referent': nr['referent'], 'invitation': nr["invitation"],
-                                      'replyto': nr["replyto"], 'replyCount': nr['details']["replyCount"],
-                                      'note_content': str(n["content"])
-                                      }
-                        self.command("merge", model.NoteRevision(**note_revisions))
-
+                replaced = {}
+                for entity, row in submission_rows(s, el["venue_id"]):
+                    if entity in (model.Content, model.Authorship):
+                        replaced[(entity, row["note"])].append(row)
+                        continue
+                    self.command("merge", entity(**row))
+                    for child in self.NOTE_ROWS.get(entity, ()):
+                        replaced[(child, row["id"])] = []
+                # after the authors, the authorship rows refer to them
+                for (entity, note), rows in replaced.items():
+                    self.replace(entity, note, rows)
 
     def print_all_data(self, table='', query=''):
         query = query if query != '' else "SELECT * FROM '{}';".format(table)
@@ -1,5 +1,5 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import Table, Column, Integer, BigInteger, String, MetaData, ForeignKey, LargeBinary
+from sqlalchemy import Table, Column, Integer, BigInteger, String, Text, MetaData, ForeignKey, LargeBinary
 
 # Table Names
 VENUE           = 'venue'
@@ -7,6 +7,9 @@ SUBMISSION       = 'submission'
 REVISIONS = 'revisions'
 NOTE = 'notes'
 NOTE_REVISION = "note_revision"
+AUTHOR = "author"
+AUTHORSHIP = "authorship"
+CONTENT = "content"
 #msc
 Base = declarative_base()
 
@@ -14,14 +17,14 @@ Base = declarative_base()
 class Venue(Base):
     __tablename__ = VENUE
     id = Column(Integer, primary_key=True)
-    venue = Column(String)
+    venue = Column(String, index=True)
     year = Column(String)
 
 
 class Submission(Base):
     __tablename__ = SUBMISSION
     id = Column(String, primary_key=True)
-    venue = Column(None, ForeignKey(Venue.id))
+    venue = Column(None, ForeignKey(Venue.id), index=True)
     original = Column(String)
     cdate = Column(BigInteger)
     tcdate = Column(BigInteger)
@@ -31,40 +34,15 @@ class Submission(Base):
     title = Column(String)
     abstract = Column(String)
     acceptance_tag = Column(String)
-    replyto = Column(String)
-    authorid0 = Column(String)
-    authorid1 = Column(String)
-    authorid2 = Column(String)
-    authorid3 = Column(String)
-    authorid4 = Column(String)
-    authorid5 = Column(String)
-    authorid6 = Column(String)
-    authorid7 = Column(String)
-    authorid8 = Column(String)
-    authorid9 = Column(String)
-    authorid10 = Column(String)
-    authorid11 = Column(String)
-    authorid12 = Column(String)
-    author0 = Column(String)
-    author1 = Column(String)
-    author2 = Column(String)
-    author3 = Column(String)
-    author4 = Column(String)
-    author5 = Column(String)
-    author6 = Column(String)
-    author7 = Column(String)
-    author8 = Column(String)
-    author9 = Column(String)
-    author10 = Column(String)
-    author11 = Column(String)
-    author12 = Column(String)
+    replyto = Column(String, index=True)
     pdf_ref = Column(String)
     pdf_binary = Column(LargeBinary, nullable=True)
-    forum = Column(String)
+    pdf_sha256 = Column(String, nullable=True)
+    pdf_size = Column(BigInteger, nullable=True)
+    forum = Column(String, index=True)
     referent = Column(String)
-    invitation = Column(String)
+    invitation = Column(String, index=True)
     replyCount = Column(Integer)
-    submission_content = Column(String)
 
 
 class Revision(Base):
@@ -79,40 +57,15 @@ class Revision(Base):
     number = Column(Integer)
     title = Column(String)
     abstract = Column(String)
-    replyto = Column(String)
-    authorid0 = Column(String)
-    authorid1 = Column(String)
-    authorid2 = Column(String)
-    authorid3 = Column(String)
-    authorid4 = Column(String)
-    authorid5 = Column(String)
-    authorid6 = Column(String)
-    authorid7 = Column(String)
-    authorid8 = Column(String)
-    authorid9 = Column(String)
-    authorid10 = Column(String)
-    authorid11 = Column(String)
-    authorid12 = Column(String)
-    author0 = Column(String)
-    author1 = Column(String)
-    author2 = Column(String)
-    author3 = Column(String)
-    author4 = Column(String)
-    author5 = Column(String)
-    author6 = Column(String)
-    author7 = Column(String)
-    author8 = Column(String)
-    author9 = Column(String)
-    author10 = Column(String)
-    author11 = Column(String)
-    author12 = Column(String)
+    replyto = Column(String, index=True)
     pdf_ref = Column(String)
     pdf_binary = Column(LargeBinary, nullable=True)
-    forum = Column(String)
+    pdf_sha256 = Column(String, nullable=True)
+    pdf_size = Column(BigInteger, nullable=True)
+    forum = Column(String, index=True)
     referent = Column(String)
-    invitation = Column(String)
+    invitation = Column(String, index=True)
     replyCount = Column(Integer)
-    revision_content = Column(String)
 
 
 class Note(Base):
@@ -127,12 +80,11 @@ class Note(Base):
     number = Column(Integer)
     title = Column(String)
     decision = Column(String)
-    forum = Column(String)
+    forum = Column(String, index=True)
     referent = Column(String)
-    invitation = Column(String)
-    replyto = Column(String)
+    invitation = Column(String, index=True)
+    replyto = Column(String, index=True)
     replyCount = Column(Integer)
-    note_content = Column(String)
 
 
 class NoteRevision(Base):
@@ -147,9 +99,36 @@ class NoteRevision(Base):
     number = Column(Integer)
     title = Column(String)
     decision = Column(String)
-    forum = Column(String)
+    forum = Column(String, index=True)
     referent = Column(String)
-    invitation = Column(String)
-    replyto = Column(String)
+    invitation = Column(String, index=True)
+    replyto = Column(String, index=True)
     replyCount = Column(Integer)
-    note_content = Column(String)
+
+
+class Author(Base):
+    __tablename__ = AUTHOR
+    # OpenReview profile id (~First_Last1) or email from the authorids of a submission
+    id = Column(String, primary_key=True)
+    name = Column(String)
+
+
+class Authorship(Base):
+    # one row per author of a submission or revision, in the order of the author list
+    __tablename__ = AUTHORSHIP
+    note = Column(String, primary_key=True)
+    position = Column(Integer, primary_key=True)
+    # NULL if the author has no authorid
+    author = Column(None, ForeignKey(Author.id), index=True)
+    name = Column(String, index=True)
+
+
+class Content(Base):
+    # content fields of submissions, revisions, notes and note revisions, one row per key or list item
+    __tablename__ = CONTENT
+    note = Column(String, primary_key=True)
+    key = Column(String, primary_key=True, index=True)
+    # -1 for single values, the index of the item for lists
+    position = Column(Integer, primary_key=True)
+    # strings are stored as they are, other values as JSON
+    value = Column(Text)
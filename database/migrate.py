@@ -0,0 +1,115 @@
+import argparse
+import ast
+import logging
+import re
+from sqlalchemy import create_engine, inspect, text
+from . import database_model as model
+from .database import SQLDatabase, add_missing_columns, author_rows, content_rows
+
+# content column of each table in the old schema
+OLD_CONTENT = {
+    model.SUBMISSION: "submission_content",
+    model.REVISIONS: "revision_content",
+    model.NOTE: "note_content",
+    model.NOTE_REVISION: "note_content",
+}
+OLD_AUTHOR = re.compile(r"author(id)?\d+")
+
+
+def migrate(engine, batch_size=1000, log=None):
+    '''
+    Migrate a database from the old schema, with the authors in the columns author0..author12 / authorid0..authorid12
+    and the content as Python repr in submission_content, revision_content and note_content,
+    to the author, authorship and content tables. The old columns are dropped afterwards and the indexes are created.
+    Columns which were added to the existing tables since (e.g. pdf_sha256 and pdf_size) are added.
+    Tables which are already migrated are skipped, so the migration can be run again after an interruption.
+
+    The note_content of note revisions was the content of their note, not of the revision. It is not migrated,
+    the content of the note itself is.
+    :param engine: SQLAlchemy engine of the database
+    :param batch_size: number of rows which are read and written at once
+    '''
+    log = log or logging.getLogger("crawler")
+    model.Base.metadata.create_all(engine)
+    add_missing_columns(engine, log)
+    for table, content_column in OLD_CONTENT.items():
+        columns = [c["name"] for c in inspect(engine).get_columns(table)]
+        old_columns = [c for c in columns if OLD_AUTHOR.fullmatch(c)] + \
+                      ([content_column] if content_column in columns else [])
+        if not old_columns:
+            continue
+        log.info("Migrating table {}".format(table))
+        with engine.begin() as connection:
+            if table != model.NOTE_REVISION and content_column in columns:
+                rows = __migrate_rows(connection, table, content_column, sorted(old_columns), batch_size, log)
+                log.info("Migrated {} rows of {}".format(rows, table))
+            for column in old_columns:
+                connection.execute(text('ALTER TABLE {} DROP COLUMN "{}"'.format(table, column)))
+
+    with engine.begin() as connection:
+        for table in model.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(connection, checkfirst=True)
+    log.info("Migration finished")
+
+
+def __migrate_rows(connection, table, content_column, old_columns, batch_size, log):
+    insert = SQLDatabase.UPSERT.get(connection.dialect.name)
+    result = connection.execute(text("SELECT id, {} FROM {}".format(
+        ", ".join('"{}"'.format(c) for c in old_columns), table)))
+    names = ["id"] + old_columns
+    migrated = 0
+    while True:
+        batch = result.fetchmany(batch_size)
+        if not batch:
+            break
+        authors, authorships, contents = {}, [], []
+        for row in batch:
+            row = dict(zip(names, row))
+            content = __parse_content(row, content_column, log)
+            if content is None:
+                # fall back to the unrolled author columns
+                content = {"authors": [row[c] for c in __numbered(row, "author") if row[c] is not None],
+                           "authorids": [row[c] for c in __numbered(row, "authorid") if row[c] is not None]}
+            else:
+                contents.extend(content_rows(row["id"], content))
+            a, s = author_rows(row["id"], content)
+            authors.update((author["id"], author) for author in a)
+            authorships.extend(s)
+        for rows, entity in ((list(authors.values()), model.Author), (authorships, model.Authorship),
+                             (contents, model.Content)):
+            if rows:
+                # executemany needs the same columns for all rows of a statement
+                for keys in set(tuple(sorted(r)) for r in rows):
+                    group = [r for r in rows if tuple(sorted(r)) == keys]
+                    stmt = insert(entity.__table__).on_conflict_do_nothing() if insert is not None \
+                        else entity.__table__.insert()
+                    connection.execute(stmt, group)
+        migrated += len(batch)
+    return migrated
+
+
+def __parse_content(row, content_column, log):
+    if row.get(content_column) is None:
+        return None
+    try:
+        content = ast.literal_eval(row[content_column])
+    except (ValueError, SyntaxError):
+        log.warning("Content of {} could not be parsed".format(row["id"]))
+        return None
+    return content if isinstance(content, dict) else None
+
+
+def __numbered(row, prefix):
+    return sorted((c for c in row if re.fullmatch(prefix + r"\d+", c)), key=lambda c: int(c[len(prefix):]))
+
+
+if __name__ == "__main__":
+    log = logging.getLogger("crawler")
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.StreamHandler())
+    parser = argparse.ArgumentParser(description="Migrate a crawler database to the normalized author and content schema")
+    parser.add_argument("engine_url", help="SQLAlchemy URL of the database, e.g. sqlite:///myCrawl")
+    parser.add_argument("--batch_size", type=int, default=1000, help="Number of rows per batch")
+    args = parser.parse_args()
+    migrate(create_engine(args.engine_url), args.batch_size, log)
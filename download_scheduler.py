@@ -0,0 +1,170 @@
+import logging
+import queue
+import threading
+import time
+from urllib.parse import urlparse
+import requests
+
+
+class DownloadScheduler:
+    '''
+    Fixed size worker pool for the PDF downloads.
+
+    Jobs are put into a bounded queue. If the queue is full, ``submit`` blocks until a worker is free again,
+    so the crawl loop can not run away from the downloads. Every host gets its own concurrency limit and
+    failed jobs are retried with exponential backoff. A job which failed with requests.exceptions.RetryError
+    is not retried, its request was already retried by the RateLimitedAdapter.
+
+    A job is a callable. If it returns an int, this is counted as the size in bytes of one downloaded PDF.
+    With ``workers=0`` the jobs are executed directly in the calling thread (no threading at all).
+    '''
+
+    def __init__(self, workers=8, queue_size=64, per_host_limit=4, retries=3, backoff=1.0, max_backoff=60.0,
+                 log=None):
+        self.log = log if log is not None else logging.getLogger("crawler")
+        self.workers = workers
+        self.per_host_limit = per_host_limit
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.q = queue.Queue(maxsize=queue_size)
+        self.host_limits = {}
+        self.lock = threading.Lock()
+        self.pdfs = 0
+        self.bytes = 0
+        self.failed = 0
+        self.started = time.time()
+        self.threads = []
+        for i in range(workers):
+            t = threading.Thread(target=self.__work, name="download-{}".format(i), daemon=True)
+            t.start()
+            self.threads.append(t)
+
+    def submit(self, host, fn, *args, label=None, group=None):
+        '''
+        Schedule a download job.
+        :param host: url or hostname the job talks to. Used for the per host concurrency limit
+        :param fn: the job
+        :param args: arguments for the job
+        :param label: name of the job in the log, e.g. the id of the PDF. The arguments are never logged,
+                      they may contain the client or the database
+        :param group: the DownloadGroup of the job, it is told when the job is finished or failed for good
+        :return: Nothing
+        '''
+        host = urlparse(host).netloc or host
+        label = label if label is not None else fn.__name__
+        if self.workers == 0:
+            try:
+                self.__run(host, fn, args, label)
+            finally:
+                if group is not None:
+                    group.task_done()
+        else:
+            # blocks if the queue is full
+            self.q.put((host, fn, args, label, group))
+
+    def group(self):
+        '''
+        :return: a new DownloadGroup, to wait for the jobs of e.g. one venue year only
+        '''
+        return DownloadGroup(self)
+
+    def join(self):
+        '''
+        Block until all submitted jobs are done
+        '''
+        self.q.join()
+
+    def close(self):
+        '''
+        Wait for all jobs and stop the workers
+        '''
+        self.join()
+        for _ in self.threads:
+            self.q.put(None)
+        for t in self.threads:
+            t.join()
+        self.threads = []
+
+    def throughput(self):
+        '''
+        :return: (PDFs per second, MB per second) since the scheduler was created
+        '''
+        elapsed = max(time.time() - self.started, 1e-9)
+        return self.pdfs / elapsed, self.bytes / elapsed / 1e6
+
+    def log_throughput(self):
+        pdfs_s, mb_s = self.throughput()
+        self.log.info("Downloaded {} PDFs ({:.1f} MB, {} failed): {:.2f} PDFs/s, {:.2f} MB/s".format(
+            self.pdfs, self.bytes / 1e6, self.failed, pdfs_s, mb_s))
+
+    def __host_limit(self, host):
+        with self.lock:
+            if host not in self.host_limits:
+                self.host_limits[host] = threading.BoundedSemaphore(self.per_host_limit)
+            return self.host_limits[host]
+
+    def __work(self):
+        while True:
+            job = self.q.get()
+            if job is None:
+                self.q.task_done()
+                break
+            host, fn, args, label, group = job
+            try:
+                self.__run(host, fn, args, label)
+            finally:
+                if group is not None:
+                    group.task_done()
+                self.q.task_done()
+
+    def __run(self, host, fn, args, label):
+        for attempt in range(self.retries + 1):
+            try:
+                with self.__host_limit(host):
+                    size = fn(*args)
+            except Exception as e:
+                if attempt == self.retries or isinstance(e, requests.exceptions.RetryError):
+                    self.log.error("Download failed after {} attempts: {} {}".format(attempt + 1, label, e))
+                    with self.lock:
+                        self.failed += 1
+                    return
+                delay = min(self.backoff * 2 ** attempt, self.max_backoff)
+                self.log.debug("Download of {} failed ({}), retry in {:.1f}s".format(label, e, delay))
+                time.sleep(delay)
+            else:
+                if isinstance(size, int):
+                    with self.lock:
+                        self.pdfs += 1
+                        self.bytes += size
+                return
+
+
+class DownloadGroup:
+    '''
+    The jobs of a part of the crawl, e.g. of one venue year. It is used like the DownloadScheduler it belongs to,
+    but join only waits for the jobs which were submitted to the group.
+    '''
+
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.pending = 0
+        self.condition = threading.Condition()
+
+    def submit(self, host, fn, *args, label=None):
+        with self.condition:
+            self.pending += 1
+        self.scheduler.submit(host, fn, *args, label=label, group=self)
+
+    def task_done(self):
+        with self.condition:
+            self.pending -= 1
+            if self.pending == 0:
+                self.condition.notify_all()
+
+    def join(self):
+        '''
+        Block until all jobs of the group are done
+        '''
+        with self.condition:
+            self.condition.wait_for(lambda: self.pending == 0)
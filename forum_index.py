@@ -0,0 +1,67 @@
+import os
+import sqlite3
+from json_stream import iter_venue_years, read_at
+
+
+class ForumIndex:
+    '''
+    On-disk index of a crawler.py output file, which maps each forum id to the byte span of its submission,
+    so a single submission can be read without parsing the whole file. It is kept in a sidecar SQLite file:
+
+        {file}_forum_index.sqlite
+
+    The index is built on first use and built again whenever the size or modification time of the file changes.
+    If a forum occurs more than once, the first submission is indexed.
+    '''
+
+    def __init__(self, file, log=None):
+        self.file = file
+        self.log = log
+        self.connection = sqlite3.connect(os.path.splitext(file)[0] + "_forum_index.sqlite")
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS source (size INTEGER, mtime INTEGER)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS forums "
+                                    "(forum TEXT PRIMARY KEY, venue TEXT, year INTEGER, offset INTEGER, length INTEGER)")
+        if self.__stale():
+            self.build()
+
+    def build(self):
+        '''
+        Index the file from scratch, in one streaming pass
+        '''
+        if self.log is not None:
+            self.log.info("Building forum index of %s", self.file)
+        stat = os.stat(self.file)
+        with open(self.file, "rb") as f, self.connection:
+            self.connection.execute("DELETE FROM forums")
+            self.connection.execute("DELETE FROM source")
+            for venue_year, submissions in iter_venue_years(f, spans=True):
+                self.connection.executemany("INSERT OR IGNORE INTO forums VALUES (?, ?, ?, ?, ?)",
+                                            ((s["forum"], venue_year.get("venue"), venue_year.get("year"), offset, length)
+                                             for s, offset, length in submissions))
+            self.connection.execute("INSERT INTO source VALUES (?, ?)", (stat.st_size, stat.st_mtime_ns))
+
+    def span(self, forum):
+        '''
+        :return: (venue, year, byte offset, byte length) of the submission of a forum or None
+        '''
+        return self.connection.execute("SELECT venue, year, offset, length FROM forums WHERE forum = ?",
+                                       (forum,)).fetchone()
+
+    def submission(self, forum):
+        '''
+        :return: the submission of a forum with its notes or None
+        '''
+        span = self.span(forum)
+        if span is None:
+            return None
+        with open(self.file, "rb") as f:
+            return read_at(f, span[2], span[3])
+
+    def close(self):
+        self.connection.close()
+
+    def __stale(self):
+        stat = os.stat(self.file)
+        row = self.connection.execute("SELECT size, mtime FROM source").fetchone()
+        return row is None or row[0] != stat.st_size or row[1] != stat.st_mtime_ns
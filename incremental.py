@@ -0,0 +1,46 @@
+def merge_venue_year(venue_year, submissions, notes, log):
+    '''
+    Merge the changed submissions and notes of an incremental crawl into a crawled venue year.
+    Changed submissions replace the old version but keep its notes, changed notes replace the old version
+    in their forum. Revisions are merged by id, new revisions first.
+    :param venue_year: the crawled venue year, it is changed in place
+    :param submissions: the changed submissions with their revisions
+    :param notes: the changed notes with their new revisions
+    :return: the merged venue year
+    '''
+    position = {s["id"]: i for i, s in enumerate(venue_year["submissions"])}
+    for s in submissions:
+        if s["id"] in position:
+            old = venue_year["submissions"][position[s["id"]]]
+            s["notes"] = old["notes"]
+            s["revisions"] = merge_revisions(old["revisions"], s["revisions"])
+            venue_year["submissions"][position[s["id"]]] = s
+        else:
+            position[s["id"]] = len(venue_year["submissions"])
+            venue_year["submissions"].append(s)
+
+    forum_idx_map = {s["forum"]: i for i, s in enumerate(venue_year["submissions"])}
+    for note in notes:
+        if note["forum"] not in forum_idx_map:
+            log.debug("No submission found for note " + note["id"] + " in forum " + note["forum"])
+            continue
+        submission = venue_year["submissions"][forum_idx_map[note["forum"]]]
+        # the submission has to be labeled again
+        submission.pop("acceptance_tag", None)
+        forum_notes = submission["notes"]
+        for i, old in enumerate(forum_notes):
+            if old["id"] == note["id"]:
+                note["revisions"] = merge_revisions(old.get("revisions", []), note["revisions"])
+                forum_notes[i] = note
+                break
+        else:
+            forum_notes.append(note)
+    return venue_year
+
+
+def merge_revisions(old, new):
+    '''
+    :return: the new revisions followed by the old revisions which are not among the new ones
+    '''
+    ids = set(r["id"] for r in new)
+    return new + [r for r in old if r["id"] not in ids]
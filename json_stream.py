@@ -0,0 +1,225 @@
+import codecs
+import json
+
+
+class JSONStreamReader:
+    '''
+    Incremental reader for large JSON files. The file is decoded chunk by chunk and only the value which is read
+    at the moment is held in memory. Arrays and objects can be walked item by item with items() and keys(),
+    single values are read with read_value().
+
+    The byte offset and length of the last value from read_value() or read_raw() are kept in span, so it can be read again
+    later with read_at().
+    '''
+
+    def __init__(self, f, chunk_size=1 << 20):
+        '''
+        :param f: file opened in binary mode
+        '''
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.json_decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        # byte offset of buffer[0] in the file
+        self.offset = 0
+        self.eof = False
+        self.span = None
+
+    def tell(self):
+        '''
+        :return: byte offset of the current position in the file
+        '''
+        return self.offset + len(self.buffer[:self.pos].encode("utf-8"))
+
+    def peek(self):
+        '''
+        Skip whitespace
+        :return: the next character or "" at the end of the file
+        '''
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\n\r":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.__compact()
+            if not self.__fill(self.chunk_size):
+                return ""
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError("Expected {!r} at byte {}".format(char, self.tell()))
+        self.pos += 1
+
+    def read_value(self):
+        '''
+        Read the next complete value (object, array, string, number, true, false or null)
+        '''
+        value, end = self.__decode()
+        self.pos = end
+        return value
+
+    def read_raw(self):
+        '''
+        Read the next complete value as JSON text, e.g. to parse it in another process
+        '''
+        value, end = self.__decode()
+        self.pos = end
+        return self.buffer[:end]
+
+    def __decode(self):
+        # decode the value at the start of the compacted buffer
+        self.peek()
+        self.__compact()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buffer, self.pos)
+                # a number at the end of the buffer may go on in the next chunk
+                if end < len(self.buffer) or self.eof:
+                    break
+            except ValueError:
+                if self.eof:
+                    raise
+            # read at least as much as the buffer holds, so a large value is not parsed again for every chunk
+            self.__fill(max(self.chunk_size, len(self.buffer)))
+        self.span = (self.offset, len(self.buffer[:end].encode("utf-8")))
+        return value, end
+
+    def items(self):
+        '''
+        Walk the array at the current position. The generator stops at each item, which has to be read
+        by the caller (with read_value, items or keys) before the generator is resumed.
+        '''
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("]")
+                return
+
+    def keys(self):
+        '''
+        Walk the object at the current position. The generator yields each key, its value has to be read
+        by the caller before the generator is resumed.
+        '''
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            if self.peek() != '"':
+                raise ValueError("Expected a key at byte {}".format(self.tell()))
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.peek() == ",":
+                self.pos += 1
+            else:
+                self.expect("}")
+                return
+
+    def __compact(self):
+        # drop the consumed part of the buffer
+        if self.pos:
+            self.offset += len(self.buffer[:self.pos].encode("utf-8"))
+            self.buffer = self.buffer[self.pos:]
+            self.pos = 0
+
+    def __fill(self, size):
+        data = self.f.read(size)
+        if not data:
+            self.buffer += self.decoder.decode(b"", final=True)
+            self.eof = True
+            return False
+        self.buffer += self.decoder.decode(data)
+        return True
+
+
+def iter_venue_years(f, spans=False, raw=False):
+    '''
+    Read the output of crawler.py one venue year and one submission at a time.
+    The submissions of a venue year have to be read before the next venue year, the rest of them is skipped otherwise.
+    :param f: crawler output opened in binary mode
+    :param spans: yield the submissions as (submission, byte offset, byte length) tuples
+    :param raw: yield the submissions as JSON text instead of dicts
+    :return: generator of (venue_year, submissions), venue_year is a dict with the other keys of the venue year
+             (keys after "submissions" are only added once the submissions are read)
+             and submissions a generator of its submissions
+    '''
+    reader = JSONStreamReader(f)
+    for _ in reader.items():
+        venue_year = {}
+        submissions = None
+        for key in reader.keys():
+            if key == "submissions":
+                submissions = __iter_submissions(reader, spans, raw)
+                yield venue_year, submissions
+                for _ in submissions:
+                    pass
+            else:
+                venue_year[key] = reader.read_value()
+        if submissions is None:
+            yield venue_year, iter([])
+
+
+def __iter_submissions(reader, spans, raw):
+    for _ in reader.items():
+        submission = reader.read_raw() if raw else reader.read_value()
+        yield (submission,) + reader.span if spans else submission
+
+
+def read_at(f, offset, length):
+    '''
+    :return: the value at a byte span of a JSON file, e.g. a submission from iter_venue_years(f, spans=True)
+    '''
+    f.seek(offset)
+    return json.loads(f.read(length))
+
+
+def dump_venue_years(venue_years, f, indent=3, serialized=False):
+    '''
+    Write venue years in one pass, with the same text as json.dump(list_of_venue_years, f, indent=indent)
+    :param venue_years: iterable of (venue_year, submissions): dict with the keys of a venue year except "submissions"
+                        and an iterable of its submissions, which are written last
+    :param f: file opened in text mode
+    :param serialized: the submissions are already serialized with dumps_submission
+    '''
+    f.write("[")
+    empty = True
+    for venue_year, submissions in venue_years:
+        f.write("\n" if empty else ",\n")
+        empty = False
+        f.write(__indent(indent, 1) + "{")
+        for key, value in venue_year.items():
+            f.write("\n" + __indent(indent, 2) + json.dumps(key) + ": " + __nested(value, indent, 2) + ",")
+        f.write("\n" + __indent(indent, 2) + '"submissions": [')
+        no_submissions = True
+        for submission in submissions:
+            f.write("\n" if no_submissions else ",\n")
+            no_submissions = False
+            f.write(submission if serialized else dumps_submission(submission, indent))
+        f.write("]" if no_submissions else "\n" + __indent(indent, 2) + "]")
+        f.write("\n" + __indent(indent, 1) + "}")
+    f.write("]" if empty else "\n]")
+
+
+def dumps_submission(submission, indent=3):
+    '''
+    Serialize a submission for dump_venue_years, e.g. in another process
+    '''
+    return __indent(indent, 3) + __nested(submission, indent, 3)
+
+
+def __indent(indent, level):
+    return " " * (indent * level)
+
+
+def __nested(value, indent, level):
+    # json.dumps of a value which is nested level deep, strings never contain a raw line break
+    return json.dumps(value, indent=indent).replace("\n", "\n" + __indent(indent, level))
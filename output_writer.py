@@ -0,0 +1,91 @@
+import json
+import os
+import re
+import threading
+
+
+class JSONLinesWriter:
+    '''
+    Incremental output of the crawler. Each finished venue year is written to its own JSON Lines file
+    (one submission per line) and recorded in a small manifest:
+
+        {path}/manifest.json
+        {path}/{venue}_{year}.jsonl
+
+    Only the manifest is read to resume a crawl, so memory stays flat no matter how large the crawl gets.
+    Iterating over the writer yields the venue years in the format of the JSON output, one at a time.
+    The writer can be shared by threads (e.g. the async crawl), the manifest is changed under a lock.
+    '''
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.manifest_path = os.path.join(path, self.MANIFEST)
+        self.lock = threading.RLock()
+        self.venue_years = []
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.venue_years = json.load(f)["venue_years"]
+
+    def done(self):
+        '''
+        :return: set of "venue year" strings which are already written
+        '''
+        return set(["{} {}".format(v["venue"], v["year"]) for v in self.venue_years])
+
+    def set_venue_id(self, venue, year, venue_id, log=None):
+        '''
+        Update the venue id of an already written venue year
+        '''
+        with self.lock:
+            for v in self.venue_years:
+                if v["venue"] == venue and v["year"] == year and v["venue_id"] != venue_id:
+                    if log is not None:
+                        log.info("Updating Venue ID: {} changed to {}".format(v["venue_id"], venue_id))
+                    v["venue_id"] = venue_id
+                    self.__write_manifest()
+
+    def write(self, venue_year):
+        '''
+        Write one finished venue year. An existing file of the same venue year is replaced.
+        :param venue_year: dict with venue_id, venue, year and submissions
+        '''
+        file_name = "{}_{}.jsonl".format(re.sub(r"[^A-Za-z0-9._-]", "_", venue_year["venue"]), venue_year["year"])
+        tmp = os.path.join(self.path, file_name + ".tmp")
+        with open(tmp, "w") as f:
+            for submission in venue_year["submissions"]:
+                f.write(json.dumps(submission))
+                f.write("\n")
+        os.replace(tmp, os.path.join(self.path, file_name))
+        entry = {"venue_id": venue_year["venue_id"], "venue": venue_year["venue"], "year": venue_year["year"],
+                 "file": file_name, "submissions": len(venue_year["submissions"])}
+        with self.lock:
+            self.venue_years = [v for v in self.venue_years
+                                if not (v["venue"] == entry["venue"] and v["year"] == entry["year"])]
+            self.venue_years.append(entry)
+            self.__write_manifest()
+
+    def read(self, entry):
+        '''
+        :param entry: manifest entry of a venue year
+        :return: the venue year in the format of the JSON output
+        '''
+        with open(os.path.join(self.path, entry["file"]), "r") as f:
+            submissions = [json.loads(line) for line in f if line.strip()]
+        return {"venue_id": entry["venue_id"], "venue": entry["venue"], "year": entry["year"],
+                "submissions": submissions}
+
+    def __iter__(self):
+        with self.lock:
+            entries = list(self.venue_years)
+        for entry in entries:
+            yield self.read(entry)
+
+    def __write_manifest(self):
+        # called with the lock held, the threads would replace each other's temporary file otherwise
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"venue_years": self.venue_years}, f, indent=1)
+        os.replace(tmp, self.manifest_path)
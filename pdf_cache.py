@@ -0,0 +1,144 @@
+import hashlib
+import os
+import shutil
+import sqlite3
+import threading
+from blob_store import request_pdf, raise_for_pdf_status
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_pdf_cache(folder, verify_hash=False, revalidate=False):
+    '''
+    :return: the shared PDFCache of a PDF folder, it is created on the first call
+    '''
+    folder = os.path.abspath(folder)
+    with _caches_lock:
+        if folder not in _caches:
+            _caches[folder] = PDFCache(folder, verify_hash, revalidate)
+        return _caches[folder]
+
+
+class PDFCache:
+    '''
+    Cache for the PDFs in the outdir/pdf/ folder, keyed by reference id.
+    For every downloaded PDF, cache.sqlite keeps the file name, size, SHA-256 and the ETag/Last-Modified headers.
+
+    A PDF is not downloaded again if its file exists with the recorded size (and hash with verify_hash).
+    A file of the same reference under another name is copied instead of downloaded.
+    A PDF file without entry, e.g. from a run before the cache existed, is taken into the cache with its size and hash.
+    With revalidate, a cached PDF is requested conditionally (If-None-Match / If-Modified-Since) and only
+    downloaded again if the server answers with new content.
+    '''
+
+    def __init__(self, folder, verify_hash=False, revalidate=False):
+        self.folder = folder
+        if not os.path.exists(folder):
+            os.makedirs(folder, exist_ok=True)
+        self.verify_hash = verify_hash
+        self.revalidate = revalidate
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.connection = sqlite3.connect(os.path.join(folder, "cache.sqlite"), check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS pdfs (id TEXT PRIMARY KEY, name TEXT, size INTEGER, "
+                                    "sha256 TEXT, etag TEXT, last_modified TEXT)")
+
+    def download(self, client, ref_id, pdf_name, chunk_size=1 << 16):
+        '''
+        Store the PDF of a reference as pdf_name in the folder, from the cache if possible.
+        :return: the number of downloaded bytes, None if the PDF came from the cache
+        :raises openreview.OpenReviewException: if the reference has no pdf
+        '''
+        entry = self.__entry(ref_id)
+        if entry is None:
+            entry = self.__adopt(ref_id, pdf_name)
+        headers = {}
+        if entry is not None and self.__valid(entry):
+            if entry["name"] != pdf_name:
+                shutil.copyfile(os.path.join(self.folder, entry["name"]), os.path.join(self.folder, pdf_name))
+                self.__store(dict(entry, name=pdf_name))
+            if not self.revalidate or not (entry["etag"] or entry["last_modified"]):
+                self.__count(hit=True)
+                return None
+            if entry["etag"]:
+                headers['If-None-Match'] = entry["etag"]
+            if entry["last_modified"]:
+                headers['If-Modified-Since'] = entry["last_modified"]
+
+        with request_pdf(client, ref_id, headers) as response:
+            if response.status_code == 304:
+                self.__count(hit=True)
+                return None
+            raise_for_pdf_status(response)
+            sha = hashlib.sha256()
+            size = 0
+            tmp = os.path.join(self.folder, pdf_name + ".tmp")
+            with open(tmp, "wb") as f:
+                for chunk in response.iter_content(chunk_size):
+                    sha.update(chunk)
+                    size += len(chunk)
+                    f.write(chunk)
+            os.replace(tmp, os.path.join(self.folder, pdf_name))
+            self.__store({"id": ref_id, "name": pdf_name, "size": size, "sha256": sha.hexdigest(),
+                          "etag": response.headers.get("ETag"),
+                          "last_modified": response.headers.get("Last-Modified")})
+        self.__count(hit=False)
+        return size
+
+    def log_stats(self, log):
+        log.info("PDF cache: {} hits, {} misses".format(self.hits, self.misses))
+
+    def __adopt(self, ref_id, pdf_name):
+        # record an existing file without entry, unless it is empty or no PDF (e.g. an interrupted download)
+        path = os.path.join(self.folder, pdf_name)
+        if not os.path.exists(path):
+            return None
+        sha = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as f:
+            if f.read(4) != b"%PDF":
+                return None
+            f.seek(0)
+            for chunk in iter(lambda: f.read(1 << 16), b""):
+                sha.update(chunk)
+                size += len(chunk)
+        entry = {"id": ref_id, "name": pdf_name, "size": size, "sha256": sha.hexdigest(), "etag": None,
+                 "last_modified": None}
+        self.__store(entry)
+        return entry
+
+    def __valid(self, entry):
+        path = os.path.join(self.folder, entry["name"])
+        if not os.path.exists(path) or os.path.getsize(path) != entry["size"]:
+            return False
+        if self.verify_hash:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 16), b""):
+                    sha.update(chunk)
+            return sha.hexdigest() == entry["sha256"]
+        return True
+
+    def __entry(self, ref_id):
+        with self.lock:
+            row = self.connection.execute("SELECT id, name, size, sha256, etag, last_modified FROM pdfs WHERE id = ?",
+                                          (ref_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(["id", "name", "size", "sha256", "etag", "last_modified"], row))
+
+    def __store(self, entry):
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO pdfs VALUES (?, ?, ?, ?, ?, ?)",
+                                    (entry["id"], entry["name"], entry["size"], entry["sha256"], entry["etag"],
+                                     entry["last_modified"]))
+
+    def __count(self, hit):
+        with self.lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
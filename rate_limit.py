@@ -0,0 +1,205 @@
+import email.utils
+import json
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+# call type: (number of retries, seconds before the first retry, doubled for each further retry)
+# the PDFs get the most retries, a failed PDF is lost for the crawl
+RETRY_POLICY = {
+    "pdf": (6, 2.0),
+    "references": (5, 1.0),
+    "notes": (5, 1.0),
+    "invitations": (5, 1.0),
+    "login": (2, 1.0),
+    "other": (3, 1.0),
+}
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    '''
+    Rate limiter which is shared by all requests to OpenReview, from all threads.
+    Requests are spaced at 1/rate seconds, after an idle time up to burst requests go out at once.
+    The rate adapts with AIMD: every successful request raises it by increase/rate (about increase requests/s per second),
+    a throttled (429) or failed (5xx, connection error) request multiplies it with decrease. Parallel requests
+    which are throttled together count as one decrease (at most one per cooldown seconds).
+    A Retry-After header of the server pauses all requests for the given time.
+    '''
+
+    def __init__(self, rate=10.0, burst=10, min_rate=0.5, max_rate=50.0, increase=0.5, decrease=0.5, cooldown=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.decreased = float("-inf")
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+        self.paused_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.waited = 0.0
+
+    def acquire(self):
+        '''
+        Block until the next request may be sent
+        '''
+        with self.lock:
+            now = time.monotonic()
+            start = max(self.next_time, now - (self.burst - 1) / self.rate, self.paused_until)
+            self.next_time = start + 1 / self.rate
+            self.requests += 1
+            wait = start - now
+            if wait > 0:
+                self.waited += wait
+        if wait > 0:
+            time.sleep(wait)
+
+    def success(self):
+        with self.lock:
+            self.rate = min(self.rate + self.increase / self.rate, self.max_rate)
+
+    def throttle(self, retry_after=None):
+        '''
+        :param retry_after: seconds from the Retry-After header or None
+        '''
+        with self.lock:
+            now = time.monotonic()
+            self.throttled += 1
+            if now - self.decreased >= self.cooldown:
+                self.rate = max(self.rate * self.decrease, self.min_rate)
+                self.decreased = now
+            if retry_after:
+                self.paused_until = max(self.paused_until, now + retry_after)
+
+    def log_stats(self, log):
+        log.info("Rate limit: {} requests, {} throttled, {:.0f}s waited, final rate {:.1f} requests/s".format(
+            self.requests, self.throttled, self.waited, self.rate))
+
+
+class RetryLedger:
+    '''
+    Record of the retried and failed requests. With a path, every entry is appended as JSON line:
+    {"time", "call", "url", "attempt", "outcome": retry | recovered | failed, "error": status code or exception}
+    '''
+
+    def __init__(self, path=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.counts = {}
+
+    def record(self, call, url, attempt, outcome, error=None):
+        with self.lock:
+            key = (call, outcome)
+            self.counts[key] = self.counts.get(key, 0) + 1
+            if self.path is not None:
+                with open(self.path, "a") as f:
+                    f.write(json.dumps({"time": time.time(), "call": call, "url": url, "attempt": attempt,
+                                        "outcome": outcome, "error": error}) + "\n")
+
+    def log_stats(self, log):
+        with self.lock:
+            counts = dict(self.counts)
+        for call in sorted(set(c for c, _ in counts)):
+            log.info("Requests of {}: {} retries, {} recovered, {} failed".format(
+                call, counts.get((call, "retry"), 0), counts.get((call, "recovered"), 0),
+                counts.get((call, "failed"), 0)))
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    '''
+    Transport adapter which sends every request through the TokenBucket and retries throttled (429),
+    failed (5xx) and broken (connection errors, timeouts) requests with the retry policy of their call type.
+    If the retries are used up, requests.exceptions.RetryError is raised (from the connection error, if any),
+    so a failure is never mistaken for a missing resource and is not retried again by the caller.
+    '''
+
+    def __init__(self, limiter, ledger=None, policy=None, max_backoff=120.0, **kwargs):
+        super().__init__(**kwargs)
+        self.limiter = limiter
+        self.ledger = ledger if ledger is not None else RetryLedger()
+        self.policy = dict(RETRY_POLICY, **(policy or {}))
+        self.max_backoff = max_backoff
+
+    def send(self, request, **kwargs):
+        call = call_type(request.path_url)
+        retries, backoff = self.policy.get(call, self.policy["other"])
+        attempt = 0
+        while True:
+            self.limiter.acquire()
+            response = None
+            try:
+                response = super().send(request, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt >= retries:
+                    self.limiter.throttle()
+                    self.ledger.record(call, request.url, attempt, "failed", repr(e))
+                    raise requests.exceptions.RetryError("{} failed after {} attempts: {!r}".format(
+                        request.url, attempt + 1, e), request=request) from e
+                error, retry_after = repr(e), None
+            else:
+                if response.status_code not in RETRY_STATUS:
+                    self.limiter.success()
+                    if attempt:
+                        self.ledger.record(call, request.url, attempt, "recovered", response.status_code)
+                    return response
+                error, retry_after = response.status_code, parse_retry_after(response.headers.get("Retry-After"))
+                if attempt >= retries:
+                    self.limiter.throttle(retry_after)
+                    self.ledger.record(call, request.url, attempt, "failed", error)
+                    raise requests.exceptions.RetryError("{} failed after {} attempts with status {}".format(
+                        request.url, attempt + 1, error), request=request, response=response)
+                response.close()
+            self.limiter.throttle(retry_after)
+            self.ledger.record(call, request.url, attempt, "retry", error)
+            delay = min(max(backoff * 2 ** attempt, retry_after or 0), self.max_backoff)
+            time.sleep(delay * random.uniform(1, 1.25))
+            attempt += 1
+
+
+def call_type(path):
+    '''
+    :return: the call type (key of RETRY_POLICY) of a request path of the OpenReview API
+    '''
+    path = path.split("?")[0].rstrip("/")
+    if path.endswith("/pdf"):
+        return "pdf"
+    for call in ("references", "notes", "invitations", "login"):
+        if path.endswith("/" + call):
+            return call
+    return "other"
+
+
+def parse_retry_after(value):
+    '''
+    :return: seconds from a Retry-After header (seconds or HTTP date) or None
+    '''
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(email.utils.parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def install(client, limiter, ledger=None, policy=None, pool_maxsize=10):
+    '''
+    Send all requests of an openreview.Client through the rate limiter and retry policy.
+    The adapter replaces the adapters of the client's session, so there is only one retry layer.
+    :param policy: dict call type -> (retries, backoff) which overrides RETRY_POLICY
+    :param pool_maxsize: number of kept-alive connections per host
+    :return: the client
+    '''
+    adapter = RateLimitedAdapter(limiter, ledger, policy, pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    return client
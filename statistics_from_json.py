@@ -1,54 +1,296 @@
 import numpy as np
-from matplotlib import pyplot as plt
-import matplotlib.ticker as ticker
-import seaborn as sns; sns.set()
 #from sklearn.neighbors import KernelDensity
+import argparse
+import functools
+import hashlib
 import json
-
-def get_info(file_name):
-    with open(file_name) as f:
-        j = json.load(f)
-
-    info_per_venue_year = {}
-    comments_per_submission = []
-    revisions_per_submission = []
-    for v in j:
-        if len(v["submissions"]) > 0:
-            if v["venue"] not in info_per_venue_year:
-                info_per_venue_year[v["venue"]] = {}
-            info_per_venue_year[v["venue"]][v["year"]] = {"sub": len(v["submissions"]),
-                                                          "accepted": 0, "rejected": 0, "withdrawn": 0, "unknown": 0,
-                                                          "comments_per_submission": [], "revisions_per_submission": [],
-                                                          "plain_comment": 0, "review": 0, "decision": 0, "other": 0}
-            for s in v["submissions"]:
-                comments_per_submission.append(len(s["notes"]))
-                revisions_per_submission.append(len(s["revisions"]))
-                info_per_venue_year[v["venue"]][v["year"]]["comments_per_submission"].append(len(s["notes"]))
-                info_per_venue_year[v["venue"]][v["year"]]["revisions_per_submission"].append(len(s["revisions"]))
-                if s["acceptance_tag"] == "accepted":
-                    info_per_venue_year[v["venue"]][v["year"]]["accepted"] += 1
-                elif s["acceptance_tag"] == "rejected":
-                    info_per_venue_year[v["venue"]][v["year"]]["rejected"] += 1
-                elif s["acceptance_tag"] == "withdrawn":
-                    info_per_venue_year[v["venue"]][v["year"]]["withdrawn"] += 1
-                elif s["acceptance_tag"] == "unknown":
-                    info_per_venue_year[v["venue"]][v["year"]]["unknown"] += 1
-                for n in s["notes"]:
-                    inv = n["invitation"].lower()
-                    if "review" in inv:
-                        info_per_venue_year[v["venue"]][v["year"]]["review"] += 1
-                    elif "comment" in inv:
-                        info_per_venue_year[v["venue"]][v["year"]]["plain_comment"] += 1
-                    elif "decision" in inv or "acceptance" in inv:
-                        info_per_venue_year[v["venue"]][v["year"]]["decision"] += 1
-                    else:
-                        info_per_venue_year[v["venue"]][v["year"]]["other"] += 1
-    return info_per_venue_year, comments_per_submission, revisions_per_submission
-
-def plot_label_heatmap(data):
-    venues = ["{} {}".format(k1, k2) for k1 in data for k2 in data[k1]]
-    labels = ["accepted", "rejected", "withdrawn", "unknown"]
-    matrix = np.array([[data[k1][k2][l]/data[k1][k2]["sub"] for l in labels] for k1 in data for k2 in data[k1]])
+import logging
+import multiprocessing
+import os
+from json_stream import iter_venue_years
+from output_writer import JSONLinesWriter
+
+log = logging.getLogger("statistics")
+# matplotlib and seaborn are imported on the first plot, see load_plotting
+plt = None
+ticker = None
+
+LABELS = ["accepted", "rejected", "withdrawn", "unknown"]
+NOTE_TYPES = ["plain_comment", "review", "decision", "other"]
+
+
+@functools.lru_cache(maxsize=None)
+def note_type(invitation):
+    inv = invitation.lower()
+    if "review" in inv:
+        return 1
+    elif "comment" in inv:
+        return 0
+    elif "decision" in inv or "acceptance" in inv:
+        return 2
+    else:
+        return 3
+
+
+def extract_venue_year(submissions):
+    """
+    Extract the columnar table of one venue year: one row per submission (tag, number of notes and revisions)
+    and per note (submission, note type). Tags and note types are indices into LABELS and NOTE_TYPES (-1: no tag).
+    :return: dict of numpy arrays
+    """
+    tags = {l: i for i, l in enumerate(LABELS)}
+    sub_tag, sub_notes, sub_revisions = [], [], []
+    note_submission, note_types = [], []
+    for i, s in enumerate(submissions):
+        sub_tag.append(tags.get(s.get("acceptance_tag"), -1))
+        sub_notes.append(len(s["notes"]))
+        sub_revisions.append(len(s["revisions"]))
+        for n in s["notes"]:
+            note_submission.append(i)
+            note_types.append(note_type(n["invitation"]))
+    return {"submission_tag": np.array(sub_tag, dtype=np.int8),
+            "submission_notes": np.array(sub_notes, dtype=np.int32),
+            "submission_revisions": np.array(sub_revisions, dtype=np.int32),
+            "note_submission": np.array(note_submission, dtype=np.int32),
+            "note_type": np.array(note_types, dtype=np.int8)}
+
+
+class StatsCache:
+    """
+    Cache of the venue year tables of a crawler output, so only new or changed venue years are extracted again.
+    The tables are content addressed by the SHA-256 of the submissions of the venue year and the manifest records
+    the venue years of the last run in input order:
+
+        {path}/manifest.json
+        {path}/{sha256}.npz
+
+    For a JSON file, the manifest also keeps its size and modification time. If they did not change,
+    the file is not read at all.
+    """
+    MANIFEST = "manifest.json"
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+        self.manifest_path = os.path.join(path, self.MANIFEST)
+        self.manifest = {"source": None, "venue_years": []}
+        if os.path.exists(self.manifest_path):
+            with open(self.manifest_path, "r") as f:
+                self.manifest = json.load(f)
+
+    def source(self):
+        return self.manifest["source"]
+
+    def venue_years(self):
+        return self.manifest["venue_years"]
+
+    def get(self, key):
+        """
+        :return: the table of a venue year with this key or None
+        """
+        file_name = os.path.join(self.path, key + ".npz")
+        if not os.path.exists(file_name):
+            return None
+        with np.load(file_name) as npz:
+            return {k: npz[k] for k in npz.files}
+
+    def put(self, key, table):
+        tmp = os.path.join(self.path, key + ".tmp.npz")
+        np.savez_compressed(tmp, **table)
+        os.replace(tmp, os.path.join(self.path, key + ".npz"))
+
+    def save(self, venue_years, source=None):
+        """
+        Write the manifest and remove the tables of venue years which are no longer in the input
+        :param venue_years: list of {"venue", "year", "key"} in input order
+        :param source: [size, modification time] of a JSON file
+        """
+        self.manifest = {"source": source, "venue_years": venue_years}
+        tmp = self.manifest_path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+        keys = set(v["key"] + ".npz" for v in venue_years)
+        for file_name in os.listdir(self.path):
+            if file_name.endswith(".npz") and file_name not in keys:
+                os.remove(os.path.join(self.path, file_name))
+
+
+def load_table(path, cache_dir=None):
+    """
+    Load the columnar table of a crawler output, one row per venue year, submission and note.
+    The tables of the venue years are cached (see StatsCache), only new or changed venue years are extracted.
+    :param path: JSON output of crawler.py or the folder of its streaming output (with manifest.json)
+    :param cache_dir: folder of the cache, default is {path without extension}_stats next to the input
+    :return: dict of numpy arrays
+    """
+    if cache_dir is None:
+        cache_dir = os.path.splitext(os.path.normpath(path))[0] + "_stats"
+    cache = StatsCache(cache_dir)
+    source = None
+    if os.path.isdir(path):
+        venue_years = list(__streaming_venue_years(path, cache))
+    else:
+        stat = os.stat(path)
+        source = [stat.st_size, stat.st_mtime_ns]
+        venue_years = None
+        if cache.source() == source:
+            venue_years = [(v, cache.get(v["key"])) for v in cache.venue_years()]
+        if venue_years is None or any(t is None for _, t in venue_years):
+            venue_years = list(__json_venue_years(path, cache))
+    cache.save([v for v, _ in venue_years], source)
+    return __concatenate(venue_years)
+
+
+def __json_venue_years(file_name, cache):
+    # the raw text of the submissions is hashed, only changed venue years are parsed into dicts
+    with open(file_name, "rb") as f:
+        for v, submissions in iter_venue_years(f, raw=True):
+            texts = list(submissions)
+            sha = hashlib.sha256()
+            for text in texts:
+                sha.update(text.encode("utf-8"))
+                sha.update(b"\n")
+            entry = {"venue": v["venue"], "year": v["year"], "key": sha.hexdigest()}
+            yield entry, __cached(cache, entry, lambda: (json.loads(text) for text in texts))
+
+
+def __streaming_venue_years(path, cache):
+    # every venue year has its own JSON Lines file, an unchanged file is only hashed
+    with open(os.path.join(path, JSONLinesWriter.MANIFEST), "r") as f:
+        manifest = json.load(f)["venue_years"]
+    for v in manifest:
+        file_name = os.path.join(path, v["file"])
+        sha = hashlib.sha256()
+        with open(file_name, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        entry = {"venue": v["venue"], "year": v["year"], "key": sha.hexdigest()}
+
+        def submissions(file_name=file_name):
+            with open(file_name, "r") as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        yield entry, __cached(cache, entry, submissions)
+
+
+def __cached(cache, entry, submissions):
+    table = cache.get(entry["key"])
+    if table is None:
+        log.info("Extracting statistics of %s %s", entry["venue"], entry["year"])
+        table = extract_venue_year(submissions())
+        cache.put(entry["key"], table)
+    return table
+
+
+def __concatenate(venue_years):
+    # join the venue year tables into one table, repeated venue years are merged
+    venue_year_index = {}
+    venues, years = [], []
+    sub_venue_year = []
+    note_submission = []
+    submissions = 0
+    for v, table in venue_years:
+        key = (v["venue"], v["year"])
+        if key not in venue_year_index:
+            venue_year_index[key] = len(venues)
+            venues.append(v["venue"])
+            years.append(v["year"])
+        sub_venue_year.append(np.full(len(table["submission_tag"]), venue_year_index[key], dtype=np.int32))
+        note_submission.append(table["note_submission"] + submissions)
+        submissions += len(table["submission_tag"])
+    tables = [t for _, t in venue_years]
+    table = {k: np.concatenate([t[k] for t in tables] or [np.zeros(0, dtype=np.int32)])
+             for k in ["submission_tag", "submission_notes", "submission_revisions", "note_type"]}
+    table.update({"venue": np.array(venues, dtype=str), "year": np.array(years, dtype=np.int32),
+                  "submission_venue_year": np.concatenate(sub_venue_year or [np.zeros(0, dtype=np.int32)]),
+                  "note_submission": np.concatenate(note_submission or [np.zeros(0, dtype=np.int32)])})
+    return table
+
+
+def aggregate(table):
+    """
+    Aggregate the table per venue year with vectorized operations.
+    Venue years without submissions are left out. Venue years are grouped by venue in the order of their first
+    appearance, so all years of a venue are next to each other.
+    :return: dict of numpy arrays, one row per venue year: venue, year, sub (submissions),
+             labels (counts of LABELS) and note_types (counts of NOTE_TYPES).
+             comments and revisions per submission are ordered by venue year, the ones of row i are
+             comments[offsets[i]:offsets[i+1]]
+    """
+    n = len(table["venue"])
+    sub_venue_year = table["submission_venue_year"]
+    sub = np.bincount(sub_venue_year, minlength=n)
+    tagged = table["submission_tag"] >= 0
+    labels = np.bincount(sub_venue_year[tagged] * len(LABELS) + table["submission_tag"][tagged],
+                         minlength=n * len(LABELS)).reshape(n, len(LABELS))
+    note_venue_year = sub_venue_year[table["note_submission"]]
+    note_types = np.bincount(note_venue_year * len(NOTE_TYPES) + table["note_type"],
+                             minlength=n * len(NOTE_TYPES)).reshape(n, len(NOTE_TYPES))
+
+    # rows with submissions, grouped by venue (stable, so years keep their order)
+    _, first, venue_index = np.unique(table["venue"], return_index=True, return_inverse=True)
+    rows = np.flatnonzero(sub > 0)
+    rows = rows[np.argsort(first[venue_index[rows]], kind="stable")]
+    position = np.full(n, len(rows))
+    position[rows] = np.arange(len(rows))
+    order = np.argsort(position[sub_venue_year], kind="stable")
+    return {"venue": table["venue"][rows], "year": table["year"][rows], "sub": sub[rows],
+            "labels": labels[rows], "note_types": note_types[rows],
+            "comments": table["submission_notes"][order], "revisions": table["submission_revisions"][order],
+            "offsets": np.concatenate([[0], np.cumsum(sub[rows])])}
+
+
+def get_info(path, cache_dir=None):
+    return aggregate(load_table(path, cache_dir))
+
+
+def __groups(data, reduce_year):
+    # labels and row ranges of the venue years or of the venues (their years are next to each other)
+    if not reduce_year:
+        labels = ["{} {}".format(v, y) for v, y in zip(data["venue"], data["year"])]
+        return labels, np.arange(len(labels) + 1)
+    starts = np.flatnonzero(np.concatenate([[True], data["venue"][1:] != data["venue"][:-1]]))
+    return ["{}".format(v) for v in data["venue"][starts]], np.append(starts, len(data["venue"]))
+
+
+def __per_submission(data, key, bounds):
+    # per submission values of each group
+    offsets = data["offsets"]
+    return [data[key][offsets[a]:offsets[b]] for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def __sums(data, key, bounds):
+    # totals of each group, for per venue year ("sub") or per submission ("comments", "revisions") values
+    totals = np.concatenate([[0], np.cumsum(data[key], dtype=np.int64)])
+    if key in ("comments", "revisions"):
+        bounds = data["offsets"][bounds]
+    return totals[bounds[1:]] - totals[bounds[:-1]]
+
+
+def load_plotting(backend=None):
+    """
+    Import matplotlib and seaborn on first use, so the text statistics do not wait for them
+    :param backend: matplotlib backend, e.g. "Agg" to render without a display
+    """
+    global plt, ticker
+    if plt is None:
+        import matplotlib
+        if backend is not None:
+            matplotlib.use(backend)
+        from matplotlib import pyplot
+        import matplotlib.ticker
+        import seaborn as sns; sns.set()
+        plt, ticker = pyplot, matplotlib.ticker
+
+
+def plot_label_heatmap(data, outdir="resources"):
+    load_plotting()
+    venues, _ = __groups(data, False)
+    labels = LABELS
+    matrix = data["labels"] / data["sub"][:, None]
 
     fig, ax = plt.subplots(figsize=(14,10))
     im = ax.imshow(matrix, cmap="plasma")
@@ -70,16 +312,16 @@ def plot_label_heatmap(data):
                            ha="center", va="center", color="w")
     ax.set_title("Acceptance label distribution for each venue")
     fig.tight_layout()
-    fig.savefig("resources/label_fig.svg", bbox_inches="tight", )
+    fig.savefig(os.path.join(outdir, "label_fig.svg"), bbox_inches="tight", )
     #plt.show()
 
-def plot_comment_type_heatmap(data):
-    venues = ["{} {}".format(k1, k2) for k1 in data for k2 in data[k1]]
-    labels = ["plain_comment", "review", "decision", "other"]
-    matrix = np.array([[0.0
-                        if sum(data[k1][k2]["comments_per_submission"]) == 0
-                        else data[k1][k2][l]/sum(data[k1][k2]["comments_per_submission"])
-                             for l in labels] for k1 in data for k2 in data[k1]])
+def plot_comment_type_heatmap(data, outdir="resources"):
+    load_plotting()
+    venues, bounds = __groups(data, False)
+    labels = NOTE_TYPES
+    comments = __sums(data, "comments", bounds)
+    matrix = np.divide(data["note_types"], comments[:, None], out=np.zeros(data["note_types"].shape),
+                       where=comments[:, None] > 0)
 
     fig, ax = plt.subplots(figsize=(14,10))
     im = ax.imshow(matrix, cmap="plasma")
@@ -101,7 +343,7 @@ def plot_comment_type_heatmap(data):
                            ha="center", va="center", color="w")
     ax.set_title("Comment type distribution for each venue")
     fig.tight_layout()
-    fig.savefig("resources/comment_type_heatmap.svg", bbox_inches="tight", )
+    fig.savefig(os.path.join(outdir, "comment_type_heatmap.svg"), bbox_inches="tight", )
     #plt.show()
 
 def autolabel(rects, ax):
@@ -114,22 +356,14 @@ def autolabel(rects, ax):
                     textcoords="offset points",
                     ha='center', va='bottom')
 
-def plot_sub_venue(data, reduce_year=True):
-    if reduce_year:
-        labels = ["{}".format(k1) for k1 in data]
-        subs = [sum([data[k1][k2]["sub"] for k2 in data[k1]]) for k1 in data]
-    else:
-        labels = ["{} {}".format(k1, k2) for k1 in data for k2 in data[k1]]
-        subs = [data[k1][k2]["sub"] for k1 in data for k2 in data[k1]]
+def plot_sub_venue(data, reduce_year=True, outdir="resources"):
+    load_plotting()
+    labels, bounds = __groups(data, reduce_year)
+    subs = __sums(data, "sub", bounds)
 
     order = np.argsort(subs)
-    nl = []
-    ns = []
-    for i in order:
-        nl.append(labels[i])
-        ns.append(subs[i])
-    labels = nl
-    subs = ns
+    labels = [labels[i] for i in order]
+    subs = subs[order].tolist()
 
     x = np.arange(len(labels))  # the label locations
     width = 0.35  # the width of the bars
@@ -150,33 +384,23 @@ def plot_sub_venue(data, reduce_year=True):
     fig.tight_layout()
 
     if reduce_year:
-        fig.savefig("resources/venue_sub_bar.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venue_sub_bar.svg"), bbox_inches="tight", )
     else:
-        fig.savefig("resources/venueyear_sub_bar.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venueyear_sub_bar.svg"), bbox_inches="tight", )
 
     #plt.show()
 
-def plot_comment_venue(data, reduce_year=True):
+def plot_comment_venue(data, reduce_year=True, outdir="resources"):
+    load_plotting()
     fig, axes = plt.subplots(nrows=2, ncols=1, figsize=(11, 8))
-    if reduce_year:
-        labels = ["{}".format(k1) for k1 in data]
-        comments = [np.concatenate([data[k1][k2]["comments_per_submission"] for k2 in data[k1]]) for k1 in data]
-    else:
-        labels = ["{} {}".format(k1, k2) for k1 in data for k2 in data[k1]]
-        comments = [data[k1][k2]["comments_per_submission"] for k1 in data for k2 in data[k1]]
-    sum_comments = [sum(c) for c in comments]
+    labels, bounds = __groups(data, reduce_year)
+    comments = __per_submission(data, "comments", bounds)
+    sum_comments = __sums(data, "comments", bounds)
 
     order = np.argsort(sum_comments)
-    nl = []
-    nc = []
-    nsc = []
-    for i in order:
-        nl.append(labels[i])
-        nc.append(comments[i])
-        nsc.append(sum_comments[i])
-    labels = nl
-    comments = nc
-    sum_comments = nsc
+    labels = [labels[i] for i in order]
+    comments = [comments[i] for i in order]
+    sum_comments = sum_comments[order].tolist()
 
     # plot violin plot
     ax = axes[0]
@@ -208,33 +432,22 @@ def plot_comment_venue(data, reduce_year=True):
 
     fig.tight_layout()
     if reduce_year:
-        fig.savefig("resources/venue_comment_distribution.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venue_comment_distribution.svg"), bbox_inches="tight", )
     else:
-        fig.savefig("resources/venueyear_comment_distribution.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venueyear_comment_distribution.svg"), bbox_inches="tight", )
 
     #plt.show()
 
-def plot_revision_venue(data, reduce_year=True):
+def plot_revision_venue(data, reduce_year=True, outdir="resources"):
+    load_plotting()
     fig, ax = plt.subplots(figsize=(11, 8))
-    if reduce_year:
-        labels = ["{}".format(k1) for k1 in data]
-        revisions = [np.concatenate([data[k1][k2]["revisions_per_submission"] for k2 in data[k1]]) for k1 in data]
-    else:
-        labels = ["{} {}".format(k1, k2) for k1 in data for k2 in data[k1]]
-        revisions = [data[k1][k2]["revisions_per_submission"] for k1 in data for k2 in data[k1]]
-    sum_revisions = [sum(c) for c in revisions]
+    labels, bounds = __groups(data, reduce_year)
+    revisions = __per_submission(data, "revisions", bounds)
+    sum_revisions = __sums(data, "revisions", bounds)
 
     order = np.argsort(sum_revisions)
-    nl = []
-    nc = []
-    nsc = []
-    for i in order:
-        nl.append(labels[i])
-        nc.append(revisions[i])
-        nsc.append(sum_revisions[i])
-    labels = nl
-    revisions = nc
-    sum_revisions = nsc
+    labels = [labels[i] for i in order]
+    revisions = [revisions[i] for i in order]
 
     # plot violin plot
     ax.violinplot(revisions,
@@ -252,16 +465,17 @@ def plot_revision_venue(data, reduce_year=True):
 
     fig.tight_layout()
     if reduce_year:
-        fig.savefig("resources/venue_revision_distribution.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venue_revision_distribution.svg"), bbox_inches="tight", )
     else:
-        fig.savefig("resources/venueyear_revision_distribution.svg", bbox_inches="tight", )
+        fig.savefig(os.path.join(outdir, "venueyear_revision_distribution.svg"), bbox_inches="tight", )
 
     #plt.show()
 
-def plot_comment_distribution(cps, bandwidth=0.5, filter=30):
+def plot_comment_distribution(cps, bandwidth=0.5, filter=30, outdir="resources"):
+    load_plotting()
     fig, ax = plt.subplots(figsize=(10, 6))
 
-    cps = [c for c in cps if c<=filter]
+    cps = cps[cps <= filter]
     #x = np.linspace(np.min(cps), np.max(cps), 1000)[:, np.newaxis]
     #kde = KernelDensity(kernel='tophat', bandwidth=bandwidth).fit(np.array(cps).reshape(-1, 1))
     #log_dens = kde.score_samples(x)
@@ -277,12 +491,13 @@ def plot_comment_distribution(cps, bandwidth=0.5, filter=30):
 
     # Tweak spacing to prevent clipping of ylabel
     fig.tight_layout()
-    fig.savefig("resources/comment_distribution.svg", bbox_inches="tight", )
+    fig.savefig(os.path.join(outdir, "comment_distribution.svg"), bbox_inches="tight", )
     #plt.show()
 
-def plot_revision_distribution(rps, bandwidth=0.5, filter=30):
+def plot_revision_distribution(rps, bandwidth=0.5, filter=30, outdir="resources"):
+    load_plotting()
     fig, ax = plt.subplots(figsize=(10, 6))
-    rps = [r for r in rps if r<=filter]
+    rps = rps[rps <= filter]
     #x = np.linspace(np.min(cps), np.max(cps), 1000)[:, np.newaxis]
     #kde = KernelDensity(kernel='tophat', bandwidth=bandwidth).fit(np.array(cps).reshape(-1, 1))
     #log_dens = kde.score_samples(x)
@@ -298,29 +513,120 @@ def plot_revision_distribution(rps, bandwidth=0.5, filter=30):
 
     # Tweak spacing to prevent clipping of ylabel
     fig.tight_layout()
-    fig.savefig("resources/revision_distribution.svg", bbox_inches="tight", )
+    fig.savefig(os.path.join(outdir, "revision_distribution.svg"), bbox_inches="tight", )
     #plt.show()
 
-def print_stats(data, cps, rps):
+def print_stats(data):
     # total
-    print("{} submissions".format(len(cps)))
-    print("{} comments".format(np.sum(cps)))
-    print("{} revisions".format(np.sum(rps)))
+    print("{} submissions".format(len(data["comments"])))
+    print("{} comments".format(np.sum(data["comments"])))
+    print("{} revisions".format(np.sum(data["revisions"])))
 
-    for s in ["plain_comment", "review", "decision", "other"]:
-        total = sum([sum([data[k1][k2][s] for k2 in data[k1]]) for k1 in data])
+    for s, total in zip(NOTE_TYPES, data["note_types"].sum(axis=0)):
         print("{} {}".format(total, s))
 
+# (file name, plot function, arguments, aggregates shown in the figure)
+# the function gets a dict of the aggregates or, if only one key is given as string, the array itself
+FIGURES = [
+    ("label_fig.svg", "plot_label_heatmap", {}, ("venue", "year", "sub", "labels")),
+    ("venue_sub_bar.svg", "plot_sub_venue", {"reduce_year": True}, ("venue", "year", "sub")),
+    ("venueyear_sub_bar.svg", "plot_sub_venue", {"reduce_year": False}, ("venue", "year", "sub")),
+    ("venue_comment_distribution.svg", "plot_comment_venue", {"reduce_year": True},
+     ("venue", "year", "offsets", "comments")),
+    ("venueyear_comment_distribution.svg", "plot_comment_venue", {"reduce_year": False},
+     ("venue", "year", "offsets", "comments")),
+    ("venue_revision_distribution.svg", "plot_revision_venue", {"reduce_year": True},
+     ("venue", "year", "offsets", "revisions")),
+    ("venueyear_revision_distribution.svg", "plot_revision_venue", {"reduce_year": False},
+     ("venue", "year", "offsets", "revisions")),
+    ("comment_distribution.svg", "plot_comment_distribution", {}, "comments"),
+    ("revision_distribution.svg", "plot_revision_distribution", {}, "revisions"),
+    #("comment_type_heatmap.svg", "plot_comment_type_heatmap", {}, ("venue", "year", "offsets", "comments", "note_types")),
+]
+
+
+def render_figures(data, outdir="resources", processes=None, changed_only=True, figures=FIGURES):
+    """
+    Render figures without a display (Agg backend) in a pool of worker processes.
+    The fingerprint of the aggregates behind each figure is kept in {outdir}/figures.json, with changed_only
+    a figure is only rendered again if its aggregates changed or its file is missing.
+    :param data: aggregates from get_info
+    :param processes: number of worker processes, default is the number of CPUs. With 1, no pool is started
+    :param figures: list of figures in the format of FIGURES
+    :return: list of the rendered file names
+    """
+    fingerprint_file = os.path.join(outdir, "figures.json")
+    fingerprints = {}
+    if os.path.exists(fingerprint_file):
+        with open(fingerprint_file, "r") as f:
+            fingerprints = json.load(f)
+    tasks = []
+    for file_name, function, kwargs, keys in figures:
+        fingerprint = __fingerprint(data, function, kwargs, keys)
+        if changed_only and fingerprints.get(file_name) == fingerprint \
+                and os.path.exists(os.path.join(outdir, file_name)):
+            continue
+        argument = data[keys] if isinstance(keys, str) else {k: data[k] for k in keys}
+        tasks.append((function, argument, dict(kwargs, outdir=outdir), file_name, fingerprint))
+    log.info("Rendering {} of {} figures".format(len(tasks), len(figures)))
+
+    processes = min(processes or os.cpu_count() or 1, len(tasks))
+    if processes > 1:
+        with multiprocessing.Pool(processes, __init_renderer) as pool:
+            rendered = pool.map(__render, tasks, chunksize=1)
+    else:
+        __init_renderer()
+        rendered = [__render(task) for task in tasks]
+
+    fingerprints.update(rendered)
+    tmp = fingerprint_file + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(fingerprints, f, indent=1)
+    os.replace(tmp, fingerprint_file)
+    return [file_name for file_name, _ in rendered]
+
+
+def __fingerprint(data, function, kwargs, keys):
+    sha = hashlib.sha256(json.dumps([function, kwargs, keys], sort_keys=True).encode("utf-8"))
+    for key in ([keys] if isinstance(keys, str) else keys):
+        array = np.ascontiguousarray(data[key])
+        sha.update("{} {} {}".format(key, array.dtype.str, array.shape).encode("utf-8"))
+        sha.update(array.tobytes())
+    return sha.hexdigest()
+
+
+def __init_renderer():
+    load_plotting("Agg")
+
+
+def __render(task):
+    function, argument, kwargs, file_name, fingerprint = task
+    globals()[function](argument, **kwargs)
+    plt.close("all")
+    log.info("Rendered {}".format(file_name))
+    return file_name, fingerprint
+
+
 if __name__ == "__main__":
-    data, cps, rps = get_info("all20200302/out.json")
-    #print_stats(data, cps, rps)
-    plot_label_heatmap(data)
-    plot_sub_venue(data, True)
-    plot_sub_venue(data, False)
-    plot_comment_venue(data, True)
-    plot_comment_venue(data, False)
-    plot_revision_venue(data, True)
-    plot_revision_venue(data, False)
-    plot_comment_distribution(cps)
-    plot_revision_distribution(rps)
-    #plot_comment_type_heatmap(data)
\ No newline at end of file
+    log.setLevel(logging.INFO)
+    log.addHandler(logging.StreamHandler())
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-f", "--file", required=True,
+                        help="JSON created by crawler.py or the folder of its streaming output")
+    parser.add_argument("-o", "--outdir", default="resources", help="Folder for the figures")
+    parser.add_argument("--cache", default=None,
+                        help="Folder of the statistics cache. Default is {file without extension}_stats")
+    parser.add_argument("--processes", type=int, default=None,
+                        help="Number of processes which render the figures. Default is the number of CPUs")
+    parser.add_argument("--all", action="store_true",
+                        help="Render all figures, not only the ones whose data changed")
+    parser.add_argument("--text", action="store_true", help="Only print the statistics, no figures")
+    args = parser.parse_args()
+
+    data = get_info(args.file, args.cache)
+    if args.text:
+        print_stats(data)
+    else:
+        if not os.path.exists(args.outdir):
+            os.makedirs(args.outdir)
+        render_figures(data, args.outdir, args.processes, changed_only=not args.all)
@@ -0,0 +1,77 @@
+import copy
+import re
+import threading
+import time
+
+
+class FakeObject:
+    '''
+    Note, reference or invitation of the FakeClient with the attributes the crawler uses and to_json()
+    '''
+
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+    def to_json(self):
+        return copy.deepcopy(self.__dict__)
+
+
+class FakeClient:
+    '''
+    In-memory stand-in for openreview.Client with the requests of the crawler. Every venue year has a submission
+    invitation with `submissions` submissions (one original reference with a pdf and one revision each)
+    and a comment invitation with one comment per submission.
+    :param delay: seconds each request takes, to measure the concurrency of the crawl
+    '''
+
+    def __init__(self, venue_years, submissions=3, delay=0.0):
+        self.baseurl = "http://fake.openreview"
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.invitations = []
+        self.notes = {}
+        self.references = {}
+        for venue, year in venue_years:
+            prefix = "{}/{}/Conference".format(venue, year)
+            submission_inv, comment_inv = prefix + "/-/Blind_Submission", prefix + "/-/Comment"
+            self.invitations += [FakeObject(id=submission_inv), FakeObject(id=comment_inv)]
+            self.notes[submission_inv], self.notes[comment_inv] = [], []
+            for i in range(submissions):
+                note_id = "{}_{}_paper{}".format(re.sub(r"\W", "_", venue), year, i)
+                self.notes[submission_inv].append(FakeObject(
+                    id=note_id, forum=note_id, original=None, invitation=submission_inv, tcdate=1, tmdate=1,
+                    content={"title": "Paper {}".format(i), "authors": ["A"], "authorids": ["~A1"]}))
+                self.notes[comment_inv].append(FakeObject(
+                    id=note_id + "_comment", forum=note_id, replyto=note_id, original=None, invitation=comment_inv,
+                    tcdate=2, tmdate=2, content={"comment": "Comment"}))
+                self.references[submission_inv] = self.references.get(submission_inv, []) + [
+                    FakeObject(id=note_id + "_rev", referent=note_id, tcdate=2, content={"pdf": "/pdf/2"}),
+                    FakeObject(id=note_id + "_orig", referent=note_id, tcdate=1, content={"pdf": "/pdf/1"})]
+
+    def __request(self):
+        with self.lock:
+            self.requests += 1
+        if self.delay:
+            time.sleep(self.delay)
+
+    def get_invitations(self, regex=None, after=None, limit=1000, with_count=False, **kwargs):
+        self.__request()
+        invitations = sorted((i for i in self.invitations if re.match(regex, i.id)), key=lambda i: i.id)
+        return self.__page(invitations, after, limit, with_count)
+
+    def get_notes(self, invitation=None, after=None, limit=1000, with_count=False, **kwargs):
+        self.__request()
+        notes = sorted(self.notes.get(invitation, []), key=lambda n: n.id)
+        return self.__page(notes, after, limit, with_count)
+
+    def get_references(self, referent=None, invitation=None, original=False, limit=1000, offset=0, **kwargs):
+        self.__request()
+        if referent is not None:
+            return [r for refs in self.references.values() for r in refs if r.referent == referent]
+        return self.references.get(invitation, [])[offset:offset + limit]
+
+    @staticmethod
+    def __page(items, after, limit, with_count):
+        page = [i for i in items if after is None or i.id > after][:limit]
+        return (page, len(items)) if with_count else page
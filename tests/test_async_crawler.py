@@ -0,0 +1,93 @@
+import gc
+import json
+import logging
+import os
+import pytest
+from async_crawler import crawl_async
+from crawler import crawl
+from output_writer import JSONLinesWriter
+from tests.fake_client import FakeClient
+
+VENUE_YEARS = [("ICLR.cc", 2019), ("ICLR.cc", 2020), ("ICLR.cc", 2021), ("MIDL.io", 2019), ("MIDL.io", 2020)]
+log = logging.getLogger("crawler")
+
+
+def config(outdir):
+    targets = {}
+    for venue, year in VENUE_YEARS:
+        targets.setdefault(venue, []).append(year)
+    return {"targets": [{"venue": venue, "years": years} for venue, years in targets.items()],
+            "outdir": str(outdir), "filename": "out.json", "output_json": True, "output_SQL": False,
+            "acceptance_labeling": False, "skip_pdf_download": True, "threaded_download": False,
+            "crawl_concurrency": 8}
+
+
+def test_async_crawl_equals_crawl(tmp_path):
+    expected = crawl(FakeClient(VENUE_YEARS), config(tmp_path), log)
+    assert [(r["venue"], r["year"]) for r in expected] == VENUE_YEARS
+    assert all(len(r["submissions"]) == 3 and len(r["submissions"][0]["notes"]) == 1 for r in expected)
+    assert crawl_async(FakeClient(VENUE_YEARS), config(tmp_path), log) == expected
+
+
+def test_async_crawl_streams_venue_years(tmp_path):
+    for run in range(5):
+        outdir = tmp_path / str(run)
+        writer = JSONLinesWriter(os.path.join(str(outdir), "out"))
+        assert crawl_async(FakeClient(VENUE_YEARS, delay=0.01), config(outdir), log, writer=writer) == []
+        with open(os.path.join(str(outdir), "out", JSONLinesWriter.MANIFEST)) as f:
+            manifest = json.load(f)["venue_years"]
+        assert sorted((v["venue"], v["year"]) for v in manifest) == sorted(VENUE_YEARS)
+        assert sorted(v["venue_id"] for v in manifest) == list(range(len(VENUE_YEARS)))
+        assert all(len(venue_year["submissions"]) == 3 for venue_year in JSONLinesWriter(writer.path))
+        assert not [f for f in os.listdir(writer.path) if f.endswith(".tmp")]
+
+
+class FailingClient(FakeClient):
+    # the references are requested per submission, one of these requests fails while many others are running
+    def get_references(self, referent=None, invitation=None, **kwargs):
+        if invitation is not None:
+            return []
+        if referent == "MIDL_io_2019_paper7":
+            raise RuntimeError("server down")
+        return super().get_references(referent=referent, **kwargs)
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_async_crawl_stops_at_the_first_error(tmp_path, caplog):
+    with pytest.raises(RuntimeError, match="server down"):
+        crawl_async(FailingClient(VENUE_YEARS, submissions=40, delay=0.01), config(tmp_path), log)
+    # unfinished tasks report their errors when they are collected
+    gc.collect()
+    assert not [r for r in caplog.records if r.name == "asyncio"]
+
+
+class ListingClient(FakeClient):
+    # counts the listings of invitations, each listing may take several requests
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.listings = []
+
+    def get_invitations(self, regex=None, after=None, **kwargs):
+        if after is None:
+            self.listings.append(regex)
+        return super().get_invitations(regex=regex, after=after, **kwargs)
+
+
+def test_all_years_equals_listed_years(tmp_path):
+    def all_years(outdir):
+        return dict(config(outdir), targets=[{"venue": "ICLR.cc", "years": "all"},
+                                             {"venue": "MIDL.io", "years": "all"}])
+
+    listed = ListingClient(VENUE_YEARS)
+    expected = crawl(listed, config(tmp_path / "listed"), log)
+    assert len(listed.listings) == len(VENUE_YEARS)
+    for crawl_fn in (crawl, crawl_async):
+        client = ListingClient(VENUE_YEARS)
+        assert crawl_fn(client, all_years(tmp_path / crawl_fn.__name__), log) == expected
+        # one listing of the invitations per venue instead of one per venue year
+        assert client.listings == ["ICLR.cc/", "MIDL.io/"]
+        assert client.requests < listed.requests
+    # a later crawl does not take the invitations from the listing of an earlier crawl
+    client = ListingClient(VENUE_YEARS + [("ICLR.cc", 2022)])
+    result = crawl(client, dict(config(tmp_path / "later"), targets=[{"venue": "ICLR.cc", "years": [2022]}]), log)
+    assert [(r["venue"], r["year"], len(r["submissions"])) for r in result] == [("ICLR.cc", 2022, 3)]
@@ -0,0 +1,42 @@
+import base64
+import json
+import threading
+import openreview
+from client_pool import ClientPool
+from rate_limit import TokenBucket, install
+
+
+def jwt(payload):
+    # a token which openreview.Client decodes, its constructor requests the profile of the user then
+    encode = lambda data: base64.urlsafe_b64encode(json.dumps(data).encode()).rstrip(b"=").decode()
+    return "{}.{}.{}".format(encode({"alg": "HS256", "typ": "JWT"}), encode(payload), encode("signature"))
+
+
+def test_thread_clients_reuse_the_token(monkeypatch):
+    monkeypatch.delenv("OPENREVIEW_USERNAME", raising=False)
+    monkeypatch.delenv("OPENREVIEW_PASSWORD", raising=False)
+    token = jwt({"user": {"id": "~Ann1", "profile": {"id": "~Ann1"}}})
+    client = openreview.Client(baseurl="http://localhost:3000")
+    client.token = token
+    client.headers["Authorization"] = "Bearer " + token
+    install(client, TokenBucket())
+
+    monkeypatch.setenv("OPENREVIEW_USERNAME", "user")
+    monkeypatch.setenv("OPENREVIEW_PASSWORD", "password")
+    calls = []
+    monkeypatch.setattr(openreview.Client, "login_user", lambda *args, **kwargs: calls.append("login_user"))
+    monkeypatch.setattr(openreview.Client, "get_profile", lambda *args, **kwargs: calls.append("get_profile"))
+
+    pool = ClientPool(client, TokenBucket())
+    clients = []
+    threads = [threading.Thread(target=lambda: clients.append(pool.get())) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == []
+    assert pool.get() is client
+    assert len(set(id(c.session) for c in clients + [client])) == 4
+    assert all(c.token == token and c.headers["Authorization"] == "Bearer " + token for c in clients)
+    assert all(c.headers is not client.headers for c in clients)
+    pool.close()
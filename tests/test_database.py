@@ -0,0 +1,71 @@
+import sqlite3
+import threading
+import pytest
+from database.database import ByteBoundedQueue, SQLDatabase
+
+
+def test_full_matches_put():
+    q = ByteBoundedQueue(100)
+    assert not q.full(1000)
+    q.put("a", 60)
+    assert not q.full(40) and q.full(41)
+    done = threading.Event()
+    producer = threading.Thread(target=lambda: (q.put("b", 41), done.set()))
+    producer.start()
+    assert not done.wait(0.1)
+    q.get()
+    q.task_done()
+    assert done.wait(1)
+    producer.join()
+    # an item larger than the queue is accepted once the queue is empty
+    q.get()
+    q.task_done()
+    assert not q.full(1000)
+
+
+def submission(content, note_content):
+    note = {"id": "n1", "original": None, "cdate": 1, "tcdate": 1, "tmdate": 1, "ddate": None, "number": 1,
+            "content": note_content, "forum": "s1", "referent": None, "invitation": "V/2019/-/Comment",
+            "replyto": "s1", "details": {"replyCount": 0}, "revisions": []}
+    return {"id": "s1", "original": None, "cdate": 1, "tcdate": 1, "tmdate": 1, "ddate": None, "number": 1,
+            "content": content, "forum": "s1", "referent": None, "invitation": "V/2019/-/Blind_Submission",
+            "replyto": None, "details": {"replyCount": 1}, "revisions": [], "notes": [note]}
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_insert_again_replaces_content(tmp_path, bulk):
+    db = SQLDatabase(dbtype="sqlite", dbname=str(tmp_path / "crawl.db"), bulk=bulk)
+    db.create_db_tables()
+    db.start()
+    venue_year = {"venue_id": 0, "venue": "V", "year": 2019}
+    db.insert_dict([dict(venue_year, submissions=[submission(
+        {"title": "T", "keywords": ["a", "b"], "authors": ["Ann", "Bob"], "authorids": ["~Ann1", "~Bob1"]},
+        {"comment": "C", "rating": "5"})])])
+    db.flush()
+    db.insert_dict([dict(venue_year, submissions=[submission(
+        {"title": "T2", "keywords": ["a"], "authors": ["Ann"], "authorids": ["~Ann1"]}, {})])])
+    db.close()
+    db.join()
+
+    connection = sqlite3.connect(str(tmp_path / "crawl.db"))
+    assert sorted(connection.execute("SELECT note, key, position, value FROM content").fetchall()) == \
+        [("s1", "authorids", 0, "~Ann1"), ("s1", "authors", 0, "Ann"), ("s1", "keywords", 0, "a"),
+         ("s1", "title", -1, "T2")]
+    assert connection.execute("SELECT note, position, author FROM authorship").fetchall() == [("s1", 0, "~Ann1")]
+
+
+@pytest.mark.parametrize("bulk", [False, True])
+def test_done_is_called_after_commit(tmp_path, bulk):
+    db = SQLDatabase(dbtype="sqlite", dbname=str(tmp_path / "crawl.db"), bulk=bulk)
+    db.create_db_tables()
+    done = []
+    db.insert_submission(0, "s1", pdf=b"%PDF", done=lambda: done.append("s1"))
+    # a row without primary key fails, in bulk mode also its batch which is then written object by object
+    db.insert_revision(None, "s1", pdf=b"%PDF", done=lambda: done.append("r1"))
+    db.insert_revision("r2", "s1", pdf=b"%PDF", done=lambda: done.append("r2"))
+    assert done == []
+    db.start()
+    db.flush()
+    assert done == ["s1", "r2"]
+    db.close()
+    db.join()
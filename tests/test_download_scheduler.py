@@ -0,0 +1,78 @@
+import logging
+import threading
+from crawl_state import CrawlState
+from crawler import download_manager, download_revision_db, tracked_download
+from database.database import SQLDatabase
+from download_scheduler import DownloadScheduler
+
+CONFIG = {"username": "user", "password": "secret", "outdir": None, "output_json": True, "output_SQL": True,
+          "pdf_store": "files"}
+
+
+class RecordingScheduler:
+    def __init__(self):
+        self.jobs = []
+
+    def submit(self, host, fn, *args, label=None):
+        self.jobs.append((fn, args, label))
+
+
+class Client:
+    baseurl = "http://fake.openreview"
+
+
+def test_failed_job_logs_only_its_label(caplog):
+    def job(config):
+        raise ValueError("broken")
+
+    scheduler = DownloadScheduler(workers=0, retries=1, backoff=0.01)
+    with caplog.at_level(logging.DEBUG, logger="crawler"):
+        scheduler.submit("host", job, CONFIG, label="ref1")
+    assert scheduler.failed == 1
+    assert "ref1" in caplog.text and "secret" not in caplog.text
+
+
+def test_download_jobs_do_not_get_the_config(tmp_path):
+    for pdf_store in ("files", "blobs"):
+        config = dict(CONFIG, outdir=str(tmp_path), pdf_store=pdf_store)
+        note = {"id": "s1", "content": {}}
+        scheduler = RecordingScheduler()
+        download_manager(note, "orig1", 0, [{"id": "rev1", "content": {}}], config, scheduler, Client(), None,
+                         logging.getLogger("crawler"))
+        assert len(scheduler.jobs) in (2, 4)
+        for fn, args, label in scheduler.jobs:
+            assert label is not None
+            assert not [a for a in args if isinstance(a, dict) and "password" in a]
+
+
+def test_db_pdfs_are_done_once_committed(tmp_path):
+    class PDFClient:
+        def get_pdf(self, ref_id, is_reference=False):
+            return b"%PDF"
+
+    state = CrawlState(str(tmp_path / "state.db"))
+    db = SQLDatabase(dbtype="sqlite", dbname=str(tmp_path / "crawl.db"))
+    db.create_db_tables()
+    tracked_download(state, "db/s1/r1", download_revision_db, "r1", PDFClient(), db, "s1",
+                     logging.getLogger("crawler"))
+    assert not state.pdf_done("db/s1/r1")
+    db.start()
+    db.flush()
+    assert state.pdf_done("db/s1/r1")
+    db.close()
+    db.join()
+
+
+def test_group_join_waits_only_for_its_jobs():
+    scheduler = DownloadScheduler(workers=2)
+    blocked, other = scheduler.group(), scheduler.group()
+    release = threading.Event()
+    finished = []
+    blocked.submit("host", release.wait, 5)
+    other.submit("host", finished.append, "other")
+    other.join()
+    assert finished == ["other"] and blocked.pending == 1
+    release.set()
+    blocked.join()
+    assert blocked.pending == 0
+    scheduler.close()
@@ -0,0 +1,64 @@
+import sqlite3
+from sqlalchemy import create_engine
+from database.database import SQLDatabase
+from database.migrate import migrate
+
+NOTE_COLUMNS = "original VARCHAR, cdate BIGINT, tcdate BIGINT, tmdate BIGINT, ddate BIGINT, number INTEGER, " \
+               "title VARCHAR, forum VARCHAR, referent VARCHAR, invitation VARCHAR, replyto VARCHAR, replyCount INTEGER"
+AUTHOR_COLUMNS = ", ".join("author{} VARCHAR, authorid{} VARCHAR".format(i, i) for i in range(13))
+# the tables of a database of the first version of the crawler
+BASELINE_SCHEMA = [
+    "CREATE TABLE venue (id INTEGER PRIMARY KEY, venue VARCHAR, year VARCHAR)",
+    "CREATE TABLE submission (id VARCHAR PRIMARY KEY, venue INTEGER REFERENCES venue (id), {}, abstract VARCHAR, "
+    "acceptance_tag VARCHAR, pdf_ref VARCHAR, pdf_binary BLOB, {}, submission_content VARCHAR)".format(
+        NOTE_COLUMNS, AUTHOR_COLUMNS),
+    "CREATE TABLE revisions (id VARCHAR PRIMARY KEY, submission VARCHAR REFERENCES submission (id), {}, "
+    "abstract VARCHAR, pdf_ref VARCHAR, pdf_binary BLOB, {}, revision_content VARCHAR)".format(
+        NOTE_COLUMNS, AUTHOR_COLUMNS),
+    "CREATE TABLE notes (id VARCHAR PRIMARY KEY, submission VARCHAR REFERENCES submission (id), {}, "
+    "decision VARCHAR, note_content VARCHAR)".format(NOTE_COLUMNS),
+    "CREATE TABLE note_revision (id VARCHAR PRIMARY KEY, submission VARCHAR REFERENCES notes (id), {}, "
+    "decision VARCHAR, note_content VARCHAR)".format(NOTE_COLUMNS),
+]
+
+
+def baseline_database(path):
+    connection = sqlite3.connect(path)
+    for statement in BASELINE_SCHEMA:
+        connection.execute(statement)
+    connection.execute("INSERT INTO venue VALUES (0, 'ICLR.cc', '2019')")
+    connection.execute("INSERT INTO submission (id, venue, title, author0, authorid0, author1, submission_content) "
+                       "VALUES ('s1', 0, 'Old', 'Ann', '~Ann1', 'Bob', ?)",
+                       (repr({"title": "Old", "authors": ["Ann", "Bob"], "authorids": ["~Ann1", None]}),))
+    connection.commit()
+    connection.close()
+
+
+def test_migrate_baseline_then_insert(tmp_path):
+    path = str(tmp_path / "crawl.db")
+    baseline_database(path)
+    migrate(create_engine("sqlite:///" + path))
+    connection = sqlite3.connect(path)
+    for table in ("submission", "revisions"):
+        columns = [row[1] for row in connection.execute("PRAGMA table_info({})".format(table))]
+        assert "pdf_sha256" in columns and "pdf_size" in columns
+    connection.close()
+
+    db = SQLDatabase(dbtype="sqlite", dbname=path, bulk=True)
+    db.create_db_tables()
+    db.start()
+    db.insert_submission(0, "s1", pdf_sha256="ab" * 32, pdf_size=3)
+    db.insert_revision("r1", "s1", pdf_sha256="cd" * 32, pdf_size=4)
+    db.close()
+    db.join()
+
+    connection = sqlite3.connect(path)
+    columns = [row[1] for row in connection.execute("PRAGMA table_info(submission)")]
+    assert "pdf_sha256" in columns and "submission_content" not in columns and "author0" not in columns
+    assert connection.execute("SELECT title, pdf_sha256, pdf_size FROM submission").fetchall() == \
+        [("Old", "ab" * 32, 3)]
+    assert connection.execute("SELECT id, pdf_size FROM revisions").fetchall() == [("r1", 4)]
+    assert connection.execute("SELECT position, author, name FROM authorship ORDER BY position").fetchall() == \
+        [(0, "~Ann1", "Ann"), (1, None, "Bob")]
+    assert connection.execute("SELECT value FROM content WHERE note = 's1' AND key = 'title'").fetchall() == \
+        [("Old",)]
@@ -0,0 +1,57 @@
+import os
+from pdf_cache import PDFCache
+
+PDF = b"%PDF-1.4 fake"
+
+
+class FakeResponse:
+    status_code = 200
+    headers = {"ETag": '"1"'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def iter_content(self, chunk_size):
+        yield PDF
+
+
+class FakeSession:
+    def __init__(self):
+        self.requests = 0
+
+    def get(self, url, **kwargs):
+        self.requests += 1
+        return FakeResponse()
+
+
+class FakeClient:
+    baseurl = "http://fake.openreview"
+
+    def __init__(self):
+        self.headers = {}
+        self.session = FakeSession()
+
+
+def test_existing_file_without_entry_is_not_downloaded(tmp_path):
+    with open(os.path.join(str(tmp_path), "s1_0.pdf"), "wb") as f:
+        f.write(PDF)
+    client = FakeClient()
+    cache = PDFCache(str(tmp_path))
+    assert cache.download(client, "r1", "s1_0.pdf") is None
+    assert client.session.requests == 0
+    # the adopted file is an entry of the cache from now on
+    assert PDFCache(str(tmp_path), verify_hash=True).download(client, "r1", "s1_0.pdf") is None
+    assert client.session.requests == 0
+
+
+def test_broken_file_without_entry_is_downloaded(tmp_path):
+    with open(os.path.join(str(tmp_path), "s1_0.pdf"), "wb") as f:
+        f.write(b"")
+    client = FakeClient()
+    assert PDFCache(str(tmp_path)).download(client, "r1", "s1_0.pdf") == len(PDF)
+    assert client.session.requests == 1
+    with open(os.path.join(str(tmp_path), "s1_0.pdf"), "rb") as f:
+        assert f.read() == PDF
@@ -0,0 +1,37 @@
+import socket
+import pytest
+import requests
+from download_scheduler import DownloadScheduler
+from rate_limit import TokenBucket, RetryLedger, RateLimitedAdapter
+
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def test_exhausted_connection_errors_raise_retry_error():
+    ledger = RetryLedger()
+    session = requests.Session()
+    session.mount("http://", RateLimitedAdapter(TokenBucket(rate=100), ledger, {"pdf": (2, 0.01)}))
+    with pytest.raises(requests.exceptions.RetryError) as e:
+        session.get("http://127.0.0.1:{}/references/pdf?id=1".format(closed_port()))
+    assert isinstance(e.value.__cause__, requests.exceptions.ConnectionError)
+    assert ledger.counts == {("pdf", "retry"): 2, ("pdf", "failed"): 1}
+
+
+def test_scheduler_does_not_retry_retry_errors():
+    attempts = []
+
+    def job(error):
+        attempts.append(error)
+        raise error("failed")
+
+    scheduler = DownloadScheduler(workers=0, retries=3, backoff=0.01)
+    scheduler.submit("host", job, requests.exceptions.RetryError)
+    assert len(attempts) == 1
+    # errors which the adapter did not see, e.g. while the body is read, are retried
+    scheduler.submit("host", job, requests.exceptions.ChunkedEncodingError)
+    assert len(attempts) == 5
+    assert scheduler.failed == 2